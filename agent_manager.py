@@ -1,20 +1,36 @@
-import subprocess
-import psutil
 import os
-import signal
-import sys
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, and_, or_, insert
+from sqlalchemy.orm import defer
 from logger_config import logger
-from database import Session, AgentStatus, CodeSnippet, DeploymentLog, AgentTask, WorkspaceFolder
+from database import session_scope, dialect_insert, bump_versions, AgentStatus, CodeSnippet, CodeBlob, DeploymentLog, AgentTask, WorkspaceFolder
 from datetime import datetime
 from agent_interaction import AgentInteraction
+from query_cache import query_cache, cached_query, invalidate_conversations
+from agent_supervisor import AgentSupervisor
+from blob_store import store_blobs, load_blobs
+from code_search import search_snippets
 
 class AgentManager:
     def __init__(self):
-        self.agent_process = None
         self.agent_names = ["Scout", "Editor", "Uploader", "Clicker", "Transaction"]
         self.interactions = {name: AgentInteraction(name) for name in self.agent_names}
         self.workspace_path = os.path.join(os.getcwd(), "agent_workspace")
         self._ensure_workspace()
+        # Hash of the last body written to each workspace file, to skip rewriting identical saves
+        self._workspace_hashes = {}
+        # Bounded pool for workspace file writes from bulk saves
+        self._file_writer = ThreadPoolExecutor(
+            max_workers=int(os.getenv('SNIPPET_WRITE_WORKERS', '4')),
+            thread_name_prefix='snippet-writer'
+        )
+        # One worker process running every agent (or one per AGENT_GROUPS group), restarted on crash
+        self.supervisor = AgentSupervisor(
+            self.agent_names,
+            self.workspace_path,
+            os.path.join(os.path.dirname(__file__), 'main.py'),
+            on_status=self.update_agent_statuses
+        )
 
     def _ensure_workspace(self):
         """Ensure workspace directories exist"""
@@ -40,14 +56,7 @@ class AgentManager:
         """Start the AI agents"""
         try:
             if not self.is_running():
-                script_path = os.path.join(os.path.dirname(__file__), 'main.py')
-                self.agent_process = subprocess.Popen(
-                    [sys.executable, script_path],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    cwd=self.workspace_path  # Run in workspace directory
-                )
-                self._update_agent_statuses(True)
+                self.supervisor.start()
                 logger.info("Agents started successfully")
                 return True
         except Exception as e:
@@ -57,11 +66,8 @@ class AgentManager:
     def stop_agents(self):
         """Stop the AI agents"""
         try:
-            if self.agent_process:
-                self.agent_process.terminate()
-                self.agent_process.wait(timeout=5)
-                self.agent_process = None
-                self._update_agent_statuses(False)
+            if self.is_running():
+                self.supervisor.stop()
                 logger.info("Agents stopped successfully")
                 return True
         except Exception as e:
@@ -70,34 +76,85 @@ class AgentManager:
 
     def is_running(self):
         """Check if agents are running"""
-        if self.agent_process:
-            return self.agent_process.poll() is None
-        return False
+        return self.supervisor.is_running()
+
+    def get_worker_status(self):
+        """State of each supervised agent worker"""
+        return self.supervisor.status()
+
+    def get_agent_pids(self):
+        """PID of each running worker process, by worker name"""
+        return self.supervisor.pids()
+
+    def get_output_stats(self):
+        """Line counters for captured agent output"""
+        return self.supervisor.output_stats()
 
     def _update_agent_statuses(self, status):
         """Update agent statuses in database"""
+        self.update_agent_statuses({agent_name: status for agent_name in self.agent_names})
+
+    def update_agent_statuses(self, statuses, tasks=None):
+        """Upsert the status (and optionally current task) of many agents in one statement"""
         try:
-            session = Session()
-            for agent_name in self.agent_names:
-                agent_status = session.query(AgentStatus).filter_by(
-                    agent_name=agent_name
-                ).first()
-
-                if agent_status:
-                    agent_status.status = status
-                    agent_status.last_updated = datetime.utcnow()
-                else:
-                    agent_status = AgentStatus(
-                        agent_name=agent_name,
-                        status=status,
-                        current_task="Idle"
-                    )
-                    session.add(agent_status)
-
-            session.commit()
-            session.close()
+            tasks = tasks or {}
+            now = datetime.utcnow()
+            rows = [
+                {
+                    'agent_name': agent_name,
+                    'status': status,
+                    'last_updated': now,
+                    'current_task': tasks.get(agent_name)
+                }
+                for agent_name, status in statuses.items()
+            ]
+            if not rows:
+                return True
+
+            with session_scope() as session:
+                stmt = dialect_insert(session, AgentStatus).values(rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[AgentStatus.agent_name],
+                    set_={
+                        'status': stmt.excluded.status,
+                        'last_updated': stmt.excluded.last_updated,
+                        # Keep the stored task unless a new one was given
+                        'current_task': func.coalesce(stmt.excluded.current_task, AgentStatus.current_task)
+                    }
+                )
+                session.execute(stmt)
+                bump_versions(session, 'agent_status')
+            query_cache.invalidate('get_agent_statuses')
+            return True
         except Exception as e:
             logger.error(f"Error updating agent statuses: {e}")
+            return False
+
+    @cached_query
+    def get_agent_statuses(self):
+        """Get status and current task for every agent in one query"""
+        statuses = {
+            agent_name: {'status': False, 'task': "Idle", 'last_updated': None}
+            for agent_name in self.agent_names
+        }
+        try:
+            with session_scope() as session:
+                rows = session.query(
+                    AgentStatus.agent_name,
+                    AgentStatus.status,
+                    AgentStatus.current_task,
+                    AgentStatus.last_updated
+                ).filter(AgentStatus.agent_name.in_(self.agent_names)).all()
+
+            for agent_name, status, task, last_updated in rows:
+                statuses[agent_name] = {
+                    'status': bool(status),
+                    'task': task or "Idle",
+                    'last_updated': last_updated
+                }
+        except Exception as e:
+            logger.error(f"Error getting agent statuses: {e}")
+        return statuses
 
     def agent_message(self, agent_name, message):
         """Send a message from an agent"""
@@ -107,91 +164,289 @@ class AgentManager:
 
     def save_code_snippet(self, filename, content, language, agent_name):
         """Save a code snippet with proper formatting"""
+        result = self.save_code_snippets([{
+            'filename': filename,
+            'content': content,
+            'language': language,
+            'agent_name': agent_name
+        }])[0]
+        return result['saved']
+
+    def save_code_snippets(self, batch):
+        """Save many snippets in one transaction and write their workspace files in parallel
+
+        Each item is a dict with filename, content, language and agent_name. Returns
+        one result per item, in order: {filename, agent_name, id, saved, written, error};
+        when a batch repeats a file, only its last item is written to the workspace.
+        Each agent in the batch gets a single summary message.
+        """
+        results = [
+            {
+                'filename': item.get('filename'),
+                'agent_name': item.get('agent_name'),
+                'id': None,
+                'saved': False,
+                'written': False,
+                'error': None
+            }
+            for item in batch
+        ]
+        items = []
+        for item, result in zip(batch, results):
+            if result['agent_name'] not in self.interactions:
+                result['error'] = f"Unknown agent: {result['agent_name']}"
+            elif not result['filename'] or item.get('content') is None:
+                result['error'] = "filename and content are required"
+            else:
+                items.append((item, result))
+        if not items:
+            return results
+
         try:
-            session = Session()
-
-            # Format code as shown in the logs
-            formatted_content = self.interactions[agent_name].code_block(content, filename)
-
-            # Save code snippet
-            snippet = CodeSnippet(
-                filename=filename,
-                content=formatted_content,
-                language=language,
-                agent_name=agent_name,
-                status='crawled'
-            )
-            session.add(snippet)
-
-            # Add task record
-            task = AgentTask(
-                agent_name=agent_name,
-                task_type='code_save',
-                task_status='completed',
-                result=f"Saved {filename}"
-            )
-            session.add(task)
-
-            # Also save to workspace
-            agent_code_path = os.path.join(self.workspace_path, agent_name, "code")
-            os.makedirs(agent_code_path, exist_ok=True)
-            with open(os.path.join(agent_code_path, filename), 'w') as f:
-                f.write(content)
-
-            session.commit()
-            session.close()
-
-            # Send agent message about the save
-            self.agent_message(agent_name, f"Saved code to {filename}")
-            return True
+            with session_scope() as session:
+                # Bodies are stored once per unique content; formatting happens on render
+                hashes = store_blobs(session, [item['content'] for item, _ in items])
+                snippet_ids = session.scalars(
+                    insert(CodeSnippet).returning(CodeSnippet.id, sort_by_parameter_order=True),
+                    [
+                        {
+                            'filename': item['filename'],
+                            'content_hash': body_hash,
+                            'language': item.get('language'),
+                            'agent_name': item['agent_name'],
+                            'status': 'crawled'
+                        }
+                        for (item, _), body_hash in zip(items, hashes)
+                    ]
+                ).all()
+                session.execute(insert(AgentTask), [
+                    {
+                        'agent_name': item['agent_name'],
+                        'task_type': 'code_save',
+                        'task_status': 'completed',
+                        'result': f"Saved {item['filename']}"
+                    }
+                    for item, _ in items
+                ])
+                agents = sorted({item['agent_name'] for item, _ in items})
+                bump_versions(session, *[
+                    scope for agent_name in agents
+                    for scope in (f'code_snippets:{agent_name}', f'agent_tasks:{agent_name}')
+                ])
         except Exception as e:
-            logger.error(f"Error saving code snippet: {e}")
-            return False
+            logger.error(f"Error saving code snippets: {e}")
+            for _, result in items:
+                result['error'] = str(e)
+            return results
+
+        for (_, result), snippet_id in zip(items, snippet_ids):
+            result['id'] = snippet_id
+            result['saved'] = True
+        for agent_name in agents:
+            invalidate_conversations(agent_name)
+            query_cache.invalidate('get_code_snippets', agent_name)
+
+        # Also save to workspace; only the last body per file needs writing
+        latest = {}
+        for (item, result), body_hash in zip(items, hashes):
+            latest[(item['agent_name'], item['filename'])] = (item['content'], body_hash, result)
+        self._write_workspace_files(latest)
+
+        # Send agent message about the save
+        for agent_name in agents:
+            saved = [item['filename'] for item, _ in items if item['agent_name'] == agent_name]
+            if len(saved) == 1:
+                self.agent_message(agent_name, f"Saved code to {saved[0]}")
+            else:
+                self.agent_message(agent_name, f"Saved {len(saved)} code files")
+        return results
+
+    def _write_workspace_files(self, files):
+        """Write {(agent, filename): (content, hash, result)} through the bounded file-writer pool"""
+        def write(key, content, body_hash, result):
+            try:
+                self._write_workspace_file(key[0], key[1], content, body_hash)
+                result['written'] = True
+            except Exception as e:
+                logger.error(f"Error writing workspace file {key[1]}: {e}")
+                result['error'] = str(e)
+
+        if len(files) == 1:
+            key, (content, body_hash, result) = next(iter(files.items()))
+            write(key, content, body_hash, result)
+            return
+        futures = [
+            self._file_writer.submit(write, key, content, body_hash, result)
+            for key, (content, body_hash, result) in files.items()
+        ]
+        for future in futures:
+            future.result()
+
+    def _write_workspace_file(self, agent_name, filename, content, body_hash):
+        """Write a snippet to the agent's code folder unless the file already holds this body"""
+        key = (agent_name, filename)
+        if self._workspace_hashes.get(key) == body_hash:
+            return
+        agent_code_path = os.path.join(self.workspace_path, agent_name, "code")
+        os.makedirs(agent_code_path, exist_ok=True)
+        with open(os.path.join(agent_code_path, filename), 'w') as f:
+            f.write(content)
+        self._workspace_hashes[key] = body_hash
+
+    def _attach_bodies(self, session, snippets):
+        """Set snippet.body from code_blobs (one query for all), or from legacy inline content"""
+        bodies = load_blobs(session, {snippet.content_hash for snippet in snippets if snippet.content_hash})
+        for snippet in snippets:
+            snippet.body = bodies.get(snippet.content_hash) if snippet.content_hash else snippet.content
+        return snippets
 
+    def format_code_snippet(self, snippet):
+        """Snippet as a fenced code block in the conversation style; needs snippet.body"""
+        if snippet.content is not None:
+            # Legacy rows were stored already formatted
+            return snippet.content
+        return self.interactions[snippet.agent_name].code_block(snippet.body or '', snippet.filename)
+
+    @cached_query
     def get_agent_conversation(self, agent_name):
         """Get recent conversation history for an agent"""
+        return self.get_recent_conversations([agent_name]).get(agent_name, [])
+
+    def get_recent_conversations(self, agent_names=None, limit=10):
+        """Get the latest `limit` conversation messages for each agent in one windowed query"""
+        agent_names = tuple(agent_names or self.agent_names)
+        return query_cache.get_or_load(
+            ('get_recent_conversations', (agent_names, limit)),
+            lambda: self._load_recent_conversations(agent_names, limit)
+        )
+
+    def _load_recent_conversations(self, agent_names, limit):
+        conversations = {agent_name: [] for agent_name in agent_names}
         try:
-            session = Session()
-            tasks = session.query(AgentTask).filter_by(
-                agent_name=agent_name
-            ).order_by(AgentTask.created_at.desc()).limit(10).all()
-
-            history = []
-            for task in tasks:
-                if task.result:
-                    history.append(self.interactions[agent_name].format_message(task.result))
-
-            session.close()
-            return history
+            with session_scope() as session:
+                ranked = session.query(
+                    AgentTask.agent_name,
+                    AgentTask.result,
+                    func.row_number().over(
+                        partition_by=AgentTask.agent_name,
+                        order_by=(AgentTask.created_at.desc(), AgentTask.id.desc())
+                    ).label('position')
+                ).filter(AgentTask.agent_name.in_(agent_names)).subquery()
+
+                rows = session.query(ranked.c.agent_name, ranked.c.result).filter(
+                    ranked.c.position <= limit
+                ).order_by(ranked.c.agent_name, ranked.c.position).all()
+
+            for agent_name, result in rows:
+                if result and agent_name in self.interactions:
+                    conversations[agent_name].append(self.interactions[agent_name].format_message(result))
         except Exception as e:
-            logger.error(f"Error getting agent conversation: {e}")
-            return []
+            logger.error(f"Error getting agent conversations: {e}")
+        return conversations
 
+    @cached_query
     def get_code_snippets(self, agent_name=None):
         """Get code snippets from database"""
         try:
-            session = Session()
-            query = session.query(CodeSnippet)
-            if agent_name:
-                query = query.filter_by(agent_name=agent_name)
-            snippets = query.order_by(CodeSnippet.created_at.desc()).all()
-            session.close()
+            with session_scope() as session:
+                query = session.query(CodeSnippet)
+                if agent_name:
+                    query = query.filter_by(agent_name=agent_name)
+                snippets = query.order_by(CodeSnippet.created_at.desc()).all()
+                self._attach_bodies(session, snippets)
             return snippets
         except Exception as e:
             logger.error(f"Error getting code snippets: {e}")
             return []
 
+    def get_code_snippets_page(self, agent_name=None, limit=50, cursor=None, include_content=False):
+        """Get one page of snippets, newest first, and the (created_at, id) cursor for the next page
+
+        Every snippet gets its body `size`. Unless include_content is set, bodies (`body`,
+        legacy `content`) and `binary_data` are not loaded; fetch them for a single
+        snippet with get_code_snippet().
+        """
+        try:
+            return self._load_code_snippets_page(agent_name, limit, cursor, include_content)
+        except Exception as e:
+            logger.error(f"Error getting code snippet page: {e}")
+            return [], None
+
+    def _load_code_snippets_page(self, agent_name, limit, cursor, include_content):
+        """get_code_snippets_page() without the error guard, for callers that must not mistake a failure for the end"""
+        with session_scope() as session:
+            query = session.query(
+                CodeSnippet,
+                func.coalesce(CodeBlob.size, func.length(CodeSnippet.content))
+            ).outerjoin(CodeBlob, CodeBlob.hash == CodeSnippet.content_hash)
+            if not include_content:
+                query = query.options(
+                    defer(CodeSnippet.content, raiseload=True),
+                    defer(CodeSnippet.binary_data, raiseload=True)
+                )
+            if agent_name:
+                query = query.filter(CodeSnippet.agent_name == agent_name)
+            if cursor:
+                created_at, snippet_id = cursor
+                query = query.filter(or_(
+                    CodeSnippet.created_at < created_at,
+                    and_(CodeSnippet.created_at == created_at, CodeSnippet.id < snippet_id)
+                ))
+            rows = query.order_by(
+                CodeSnippet.created_at.desc(), CodeSnippet.id.desc()
+            ).limit(limit).all()
+            snippets = []
+            for snippet, size in rows:
+                snippet.size = size
+                snippets.append(snippet)
+            if include_content:
+                self._attach_bodies(session, snippets)
+
+        next_cursor = None
+        if len(snippets) == limit:
+            next_cursor = (snippets[-1].created_at, snippets[-1].id)
+        return snippets, next_cursor
+
+    def search_code_snippets(self, query, agent_name=None, language=None, status=None, limit=20, offset=0, collapse=True):
+        """Full-text search over snippet bodies; returns (ranked results with highlights, has_more)"""
+        try:
+            with session_scope() as session:
+                return search_snippets(session, query, agent_name, language, status, limit, offset, collapse)
+        except Exception as e:
+            logger.error(f"Error searching code snippets: {e}")
+            return [], False
+
+    def get_code_snippet(self, snippet_id):
+        """Get a single snippet with its full content"""
+        try:
+            with session_scope() as session:
+                snippet = session.get(CodeSnippet, snippet_id)
+                if snippet:
+                    self._attach_bodies(session, [snippet])
+                return snippet
+        except Exception as e:
+            logger.error(f"Error getting code snippet {snippet_id}: {e}")
+            return None
+
+    def iter_code_snippets(self, agent_name=None, batch_size=500, include_content=True):
+        """Stream snippets page by page for export jobs, holding one batch in memory at a time"""
+        cursor = None
+        while True:
+            # Errors propagate: an export cut short must fail, not look complete
+            snippets, cursor = self._load_code_snippets_page(agent_name, batch_size, cursor, include_content)
+            yield from snippets
+            if cursor is None:
+                return
+
     def create_folder(self, folder_name):
         """Create a new folder in the workspace"""
         try:
             folder_path = os.path.join(self.workspace_path, folder_name)
             os.makedirs(folder_path, exist_ok=True)
 
-            session = Session()
-            workspace_folder = WorkspaceFolder(folder_name=folder_name)
-            session.add(workspace_folder)
-            session.commit()
-            session.close()
+            with session_scope() as session:
+                session.add(WorkspaceFolder(folder_name=folder_name))
+                bump_versions(session, 'workspace_folders')
 
             logger.info(f"Created folder: {folder_name}")
             return True
@@ -206,21 +461,22 @@ class AgentManager:
                 logger.error("GitHub token not found")
                 return False
 
-            # Log deployment attempt
-            session = Session()
-            deployment = DeploymentLog(
-                agent_name=agent_name,
-                deployment_status='in_progress',
-                commit_message=commit_message
-            )
-            session.add(deployment)
-            session.commit()
-
-            # Update deployment status
-            deployment.deployment_status = 'completed'
-            deployment.github_url = f"https://github.com/{agent_name}/deployed-code"
-            session.commit()
-            session.close()
+            with session_scope() as session:
+                # Log deployment attempt
+                deployment = DeploymentLog(
+                    agent_name=agent_name,
+                    deployment_status='in_progress',
+                    commit_message=commit_message
+                )
+                session.add(deployment)
+                bump_versions(session, f'deployment_logs:{agent_name}')
+                session.commit()
+
+                # Update deployment status
+                deployment.deployment_status = 'completed'
+                deployment.github_url = f"https://github.com/{agent_name}/deployed-code"
+                bump_versions(session, f'deployment_logs:{agent_name}')
+            query_cache.invalidate('get_deployment_logs', agent_name)
 
             logger.info(f"Code deployed for agent: {agent_name}")
             return True
@@ -228,15 +484,15 @@ class AgentManager:
             logger.error(f"Error deploying to GitHub: {e}")
             return False
 
+    @cached_query
     def get_deployment_logs(self, agent_name=None):
         """Get deployment logs from database"""
         try:
-            session = Session()
-            query = session.query(DeploymentLog)
-            if agent_name:
-                query = query.filter_by(agent_name=agent_name)
-            logs = query.order_by(DeploymentLog.created_at.desc()).all()
-            session.close()
+            with session_scope() as session:
+                query = session.query(DeploymentLog)
+                if agent_name:
+                    query = query.filter_by(agent_name=agent_name)
+                logs = query.order_by(DeploymentLog.created_at.desc()).all()
             return logs
         except Exception as e:
             logger.error(f"Error getting deployment logs: {e}")
@@ -0,0 +1,234 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import psutil
+from logger_config import logger
+from output_pump import OutputPump
+
+# Restart backoff for crashed workers: base * 2^(failures - 1), capped
+AGENT_RESTART_BASE = float(os.getenv('AGENT_RESTART_BASE', 1))
+AGENT_RESTART_MAX = float(os.getenv('AGENT_RESTART_MAX', 60))
+
+# A worker that stayed up this long has its failure count reset
+AGENT_STABLE_SECONDS = float(os.getenv('AGENT_STABLE_SECONDS', 60))
+
+# How long stop() waits for workers to exit on SIGTERM before killing them
+AGENT_DRAIN_TIMEOUT = float(os.getenv('AGENT_DRAIN_TIMEOUT', 10))
+
+# Optional per-worker limits; unset means unlimited
+AGENT_CPU_SECONDS = os.getenv('AGENT_CPU_SECONDS')
+AGENT_MEMORY_MB = os.getenv('AGENT_MEMORY_MB')
+
+# Pin each worker to its own core, round-robin
+AGENT_PIN_CPUS = os.getenv('AGENT_PIN_CPUS', 'false').lower() in ('1', 'true', 'yes')
+
+def parse_agent_groups(agent_names, spec=None):
+    """Split agents into worker groups from a spec like "Scout,Editor;Uploader"; the rest share one worker
+
+    Without a spec every agent runs in a single worker, as the agent script
+    starts all agents itself. Splitting them needs a script that only starts the
+    agents listed in its AGENT_NAMES environment variable.
+    """
+    spec = os.getenv('AGENT_GROUPS', '') if spec is None else spec
+    groups, grouped = [], set()
+    for part in spec.split(';'):
+        group = [name.strip() for name in part.split(',') if name.strip() in agent_names and name.strip() not in grouped]
+        if group:
+            groups.append(group)
+            grouped.update(group)
+    rest = [name for name in agent_names if name not in grouped]
+    if rest:
+        groups.append(rest)
+    return groups
+
+class AgentWorker:
+    """One supervised process running a group of agents"""
+
+    def __init__(self, agents, cpu=None):
+        self.name = '-'.join(agents)
+        self.agents = agents
+        self.cpu = cpu
+        self.process = None
+        self.pump = None
+        self.state = 'stopped'
+        self.started_at = None
+        self.next_start = None
+        self.failures = 0
+        self.restarts = 0
+        self.last_exit = None
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+class AgentSupervisor:
+    """Runs one worker process per agent group and restarts crashed workers with backoff"""
+
+    def __init__(self, agent_names, workspace_path, script_path, groups=None, on_status=None, poll_interval=1.0):
+        self.workspace_path = workspace_path
+        self.script_path = script_path
+        self.on_status = on_status
+        self.poll_interval = poll_interval
+        cpu_count = psutil.cpu_count() or 1
+        self.workers = [
+            AgentWorker(agents, cpu=index % cpu_count if AGENT_PIN_CPUS else None)
+            for index, agents in enumerate(groups or parse_agent_groups(agent_names))
+        ]
+        self._agent_names = agent_names
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Spawn every worker and start watching them"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            reports = [report for worker in self.workers for report in self._spawn(worker)]
+        self._report(reports)
+        self._thread = threading.Thread(target=self._run, name='agent-supervisor', daemon=True)
+        self._thread.start()
+        logger.info(f"Agent supervisor started {len(self.workers)} workers")
+
+    def stop(self, timeout=None):
+        """Drain workers: SIGTERM all of them, wait up to timeout, then kill stragglers"""
+        timeout = AGENT_DRAIN_TIMEOUT if timeout is None else timeout
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+        with self._lock:
+            live = [worker for worker in self.workers if worker.is_alive()]
+            for worker in live:
+                worker.state = 'draining'
+                worker.process.terminate()
+
+            deadline = time.monotonic() + timeout
+            for worker in live:
+                try:
+                    worker.process.wait(timeout=max(deadline - time.monotonic(), 0))
+                except subprocess.TimeoutExpired:
+                    logger.warning(f"Worker {worker.name} did not exit in {timeout}s, killing it")
+                    worker.process.kill()
+                    worker.process.wait()
+
+            for worker in self.workers:
+                if worker.pump:
+                    worker.pump.join(timeout=5)
+                worker.state = 'stopped'
+                worker.next_start = None
+        self._report([(agent, False, 'Stopped') for agent in self._agent_names])
+        logger.info("Agent supervisor stopped")
+
+    def is_running(self):
+        """True while workers are being supervised, including ones waiting to restart"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _spawn(self, worker):
+        """Start a worker's process; returns the liveness reports for its agents"""
+        try:
+            worker.process = subprocess.Popen(
+                [sys.executable, self.script_path],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=self.workspace_path,  # Run in workspace directory
+                env={**os.environ, 'PYTHONUNBUFFERED': '1', 'AGENT_NAMES': ','.join(worker.agents)},
+                text=True,
+                encoding='utf-8',
+                errors='replace'
+            )
+            self._apply_limits(worker)
+            # Keep both pipes drained so a chatty agent never blocks on a full pipe
+            worker.pump = OutputPump(
+                worker.process, worker.agents, self.workspace_path,
+                agent=worker.agents[0] if len(worker.agents) == 1 else None
+            ).start()
+            worker.state = 'running'
+            worker.started_at = time.monotonic()
+            worker.next_start = None
+            logger.info(f"Started worker {worker.name} (pid {worker.process.pid})")
+            return [(agent, True, 'Running') for agent in worker.agents]
+        except Exception as e:
+            logger.error(f"Failed to start worker {worker.name}: {e}")
+            return self._schedule_restart(worker, f"Failed to start: {e}")
+
+    def _apply_limits(self, worker):
+        try:
+            proc = psutil.Process(worker.process.pid)
+            if worker.cpu is not None:
+                proc.cpu_affinity([worker.cpu])
+            if AGENT_CPU_SECONDS:
+                seconds = int(AGENT_CPU_SECONDS)
+                proc.rlimit(psutil.RLIMIT_CPU, (seconds, seconds))
+            if AGENT_MEMORY_MB:
+                limit = int(AGENT_MEMORY_MB) * 1024 * 1024
+                proc.rlimit(psutil.RLIMIT_AS, (limit, limit))
+        except (psutil.Error, AttributeError, ValueError) as e:
+            logger.error(f"Error applying limits to worker {worker.name}: {e}")
+
+    def _schedule_restart(self, worker, reason):
+        if worker.started_at is not None and time.monotonic() - worker.started_at >= AGENT_STABLE_SECONDS:
+            worker.failures = 0
+        worker.failures += 1
+        delay = min(AGENT_RESTART_BASE * 2 ** (worker.failures - 1), AGENT_RESTART_MAX)
+        worker.state = 'backoff'
+        worker.started_at = None
+        worker.next_start = time.monotonic() + delay
+        task = f"{reason}, restarting in {delay:g}s"
+        logger.warning(f"Worker {worker.name}: {task}")
+        return [(agent, False, task) for agent in worker.agents]
+
+    def _run(self):
+        while not self._stopping.wait(self.poll_interval):
+            reports = []
+            with self._lock:
+                now = time.monotonic()
+                for worker in self.workers:
+                    if self._stopping.is_set():
+                        break
+                    if worker.state == 'running' and not worker.is_alive():
+                        worker.last_exit = worker.process.returncode
+                        reports.extend(self._schedule_restart(worker, f"Exited with code {worker.last_exit}"))
+                    elif worker.state == 'backoff' and now >= worker.next_start:
+                        worker.restarts += 1
+                        reports.extend(self._spawn(worker))
+            self._report(reports)
+
+    def _report(self, reports):
+        if self.on_status and reports:
+            self.on_status(
+                {agent: alive for agent, alive, _ in reports},
+                {agent: task for agent, _, task in reports if task}
+            )
+
+    def status(self):
+        """State, pid, restart count and uptime of each worker"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                worker.name: {
+                    'agents': worker.agents,
+                    'state': worker.state,
+                    'pid': worker.process.pid if worker.is_alive() else None,
+                    'restarts': worker.restarts,
+                    'last_exit': worker.last_exit,
+                    'uptime': now - worker.started_at if worker.started_at is not None else None
+                }
+                for worker in self.workers
+            }
+
+    def pids(self):
+        """PID of every live worker, by worker name"""
+        with self._lock:
+            return {worker.name: worker.process.pid for worker in self.workers if worker.is_alive()}
+
+    def output_stats(self):
+        """Captured output counters from every worker, by agent"""
+        stats = {}
+        for worker in self.workers:
+            if worker.pump:
+                stats.update(worker.pump.stats())
+        return stats
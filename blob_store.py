@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from database import dialect_insert, CodeBlob
+from code_search import index_blobs
+
+try:
+    import zstandard
+except ImportError:  # Optional; zlib is always available
+    zstandard = None
+
+# Codec for new blobs; zstd is used when the zstandard package is installed
+BLOB_COMPRESSION = os.getenv('BLOB_COMPRESSION', 'zstd' if zstandard else 'zlib')
+if BLOB_COMPRESSION == 'zstd' and zstandard is None:
+    BLOB_COMPRESSION = 'zlib'
+
+# Decompressed bodies kept in memory; blobs never change, so entries never go stale
+BLOB_CACHE_SIZE = int(os.getenv('BLOB_CACHE_SIZE', 256))
+
+# Rows per multi-row INSERT and hashes per IN (...), to stay under bound-parameter limits
+STORE_CHUNK_SIZE = 500
+LOAD_CHUNK_SIZE = 500
+
+def content_hash(text):
+    """Hex SHA-256 of a snippet body"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def compress(data):
+    """Compress with the configured codec; returns (codec, payload), keeping data as-is if it doesn't shrink"""
+    if BLOB_COMPRESSION == 'zstd':
+        payload = zstandard.ZstdCompressor().compress(data)
+    elif BLOB_COMPRESSION == 'zlib':
+        payload = zlib.compress(data, 6)
+    else:
+        return 'none', data
+    if len(payload) >= len(data):
+        return 'none', data
+    return BLOB_COMPRESSION, payload
+
+def decompress(codec, payload):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Blob is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if codec == 'zlib':
+        return zlib.decompress(payload)
+    return payload
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _remember(blob_hash, text):
+    with _cache_lock:
+        _cache[blob_hash] = text
+        _cache.move_to_end(blob_hash)
+        while len(_cache) > BLOB_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def store_blobs(session, texts):
+    """Store each unique body once and return their hashes in input order
+
+    Bodies already in code_blobs are skipped by the database (ON CONFLICT DO
+    NOTHING), so saving the same file again writes no blob data.
+    """
+    hashes = [content_hash(text) for text in texts]
+    bodies = dict(zip(hashes, texts))
+    rows = []
+    for blob_hash, text in bodies.items():
+        data = text.encode('utf-8')
+        codec, payload = compress(data)
+        rows.append({'hash': blob_hash, 'compression': codec, 'size': len(data), 'data': payload})
+
+    new_hashes = []
+    for start in range(0, len(rows), STORE_CHUNK_SIZE):
+        stmt = dialect_insert(session, CodeBlob).values(rows[start:start + STORE_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_nothing(index_elements=[CodeBlob.hash]).returning(CodeBlob.hash)
+        new_hashes.extend(session.scalars(stmt).all())
+
+    # Only bodies seen for the first time need indexing for search
+    index_blobs(session, {blob_hash: bodies[blob_hash] for blob_hash in new_hashes})
+    return hashes
+
+def store_blob(session, text):
+    """Store one body; returns its hash"""
+    return store_blobs(session, [text])[0]
+
+def load_blobs(session, hashes):
+    """Map hash -> body for the given hashes, reading only those not already cached"""
+    found, missing = {}, set()
+    with _cache_lock:
+        for blob_hash in hashes:
+            if blob_hash in _cache:
+                found[blob_hash] = _cache[blob_hash]
+                _cache.move_to_end(blob_hash)
+            elif blob_hash:
+                missing.add(blob_hash)
+    missing = sorted(missing)
+    for start in range(0, len(missing), LOAD_CHUNK_SIZE):
+        rows = session.query(CodeBlob.hash, CodeBlob.compression, CodeBlob.data).filter(
+            CodeBlob.hash.in_(missing[start:start + LOAD_CHUNK_SIZE])
+        ).all()
+        for blob_hash, codec, payload in rows:
+            text = decompress(codec, payload).decode('utf-8')
+            found[blob_hash] = text
+            _remember(blob_hash, text)
+    return found
@@ -0,0 +1,141 @@
+import os
+import select
+import threading
+import time
+from database import engine, session_scope, ChangeVersion, CHANGE_CHANNEL
+from logger_config import logger
+
+class ChangeFeed:
+    """Per-scope change counters, read once per interval and shared by every dashboard session
+
+    Writers bump scopes such as 'agent_status' or 'code_snippets:Scout' with
+    database.bump_versions() in the same transaction as their change. Readers
+    compare version(...) against the value they last rendered. On Postgres a
+    LISTEN thread refreshes the counters as soon as a change commits; otherwise
+    (or if listening fails) they are polled every poll_interval seconds.
+    Background services can subscribe() to be called when scopes change.
+    """
+
+    def __init__(self, poll_interval=None, listen_poll_interval=None):
+        self.poll_interval = poll_interval or float(os.getenv('CHANGE_FEED_POLL_INTERVAL', '2'))
+        # Safety-net poll while LISTEN/NOTIFY is delivering changes
+        self.listen_poll_interval = listen_poll_interval or float(os.getenv('CHANGE_FEED_LISTEN_POLL_INTERVAL', '30'))
+        self._versions = {}
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        self._notified = threading.Event()
+        self._stop = threading.Event()
+        self._listening = False
+        self.listener_thread = None
+        self._subscribers = []
+
+    def subscribe(self, scopes, callback):
+        """Call callback(changed scopes) whenever any of scopes changes, from the feed's thread"""
+        self._subscribers.append((frozenset(scopes), callback))
+
+    def _publish(self, changed):
+        for scopes, callback in list(self._subscribers):
+            hits = scopes & changed
+            if hits:
+                try:
+                    callback(hits)
+                except Exception as e:
+                    logger.error(f"Error in change feed subscriber: {e}")
+
+    def start(self):
+        """Start the LISTEN thread when the database supports it, else a poll thread for subscribers"""
+        if not self.listener_thread:
+            self._stop.clear()
+            target = self._listen if engine.dialect.name == 'postgresql' else self._poll
+            self.listener_thread = threading.Thread(target=target)
+            self.listener_thread.daemon = True
+            self.listener_thread.start()
+
+    def _poll(self):
+        """Refresh the counters every poll_interval, so subscribers hear of changes without a reader"""
+        while True:
+            if self._subscribers:
+                self.versions()
+            if self._stop.wait(self.poll_interval):
+                break
+
+    def stop(self):
+        self._stop.set()
+        if self.listener_thread:
+            self.listener_thread.join()
+            self.listener_thread = None
+
+    def _listen(self):
+        """Wait for NOTIFY on the change channel, reconnecting after errors"""
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = engine.raw_connection()
+                connection.detach()
+                dbapi_connection = connection.driver_connection
+                dbapi_connection.autocommit = True
+                dbapi_connection.cursor().execute(f"LISTEN {CHANGE_CHANNEL}")
+                self._listening = True
+                logger.info("Change feed listening for notifications")
+                # Catch up on anything committed before LISTEN took effect
+                self._notified.set()
+                if self._subscribers:
+                    self.versions()
+
+                while not self._stop.is_set():
+                    readable, _, _ = select.select([dbapi_connection], [], [], 1.0)
+                    if readable:
+                        dbapi_connection.poll()
+                        if dbapi_connection.notifies:
+                            changed = {
+                                scope
+                                for notify in dbapi_connection.notifies
+                                for scope in notify.payload.split(',')
+                            }
+                            dbapi_connection.notifies.clear()
+                            self._notified.set()
+                            self._publish(changed)
+            except Exception as e:
+                logger.warning(f"Change feed listener error, polling instead: {e}")
+                if self._subscribers:
+                    self.versions()
+                self._stop.wait(self.poll_interval)
+            finally:
+                self._listening = False
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+    def _stale(self):
+        if self._last_refresh is None or self._notified.is_set():
+            return True
+        interval = self.listen_poll_interval if self._listening else self.poll_interval
+        return time.monotonic() - self._last_refresh >= interval
+
+    def versions(self):
+        """All scope versions, refreshed from the database at most once per interval"""
+        changed = set()
+        with self._lock:
+            if self._stale():
+                self._notified.clear()
+                try:
+                    with session_scope() as session:
+                        rows = session.query(ChangeVersion.scope, ChangeVersion.version).all()
+                    versions = dict(rows)
+                    # The first read reports every scope, so subscribers can't miss an early change
+                    changed = {scope for scope, version in versions.items() if self._versions.get(scope) != version}
+                    self._versions = versions
+                except Exception as e:
+                    logger.error(f"Error reading change feed: {e}")
+                self._last_refresh = time.monotonic()
+            versions = self._versions
+        if changed:
+            self._publish(changed)
+        return versions
+
+    def version(self, *scopes):
+        """Combined version of one or more scopes; changes whenever any of them does"""
+        versions = self.versions()
+        return tuple(versions.get(scope, 0) for scope in scopes)
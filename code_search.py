@@ -0,0 +1,123 @@
+import re
+from sqlalchemy import text, DateTime
+
+# The code_search table is created by migration 0009 and is dialect specific:
+#   postgresql: (hash, body, document tsvector generated from body) with a GIN index
+#   sqlite:     FTS5 virtual table (hash UNINDEXED, body)
+# It holds one row per unique body in code_blobs, so re-saved files are indexed once.
+
+# Characters around matched terms in highlighted fragments
+HIGHLIGHT_START = '<<'
+HIGHLIGHT_END = '>>'
+
+# Rows per INSERT when indexing
+INDEX_CHUNK_SIZE = 500
+
+TERM_PATTERN = re.compile(r'\w+')
+
+def search_terms(query):
+    """Word terms of a user query; punctuation is dropped so no input can break the match syntax"""
+    return TERM_PATTERN.findall(query or '')
+
+def index_blobs(session, bodies):
+    """Add {hash: body} to the search index; callers pass only newly stored blobs"""
+    rows = [{'hash': blob_hash, 'body': body} for blob_hash, body in bodies.items()]
+    statement = text("INSERT INTO code_search (hash, body) VALUES (:hash, :body)")
+    for start in range(0, len(rows), INDEX_CHUNK_SIZE):
+        session.execute(statement, rows[start:start + INDEX_CHUNK_SIZE])
+
+def _filters(agent_name, language, status, alias='s'):
+    clauses, params = [], {}
+    for column, value in (('agent_name', agent_name), ('language', language), ('status', status)):
+        if value:
+            clauses.append(f"{alias}.{column} = :{column}")
+            params[column] = value
+    return ''.join(f" AND {clause}" for clause in clauses), params
+
+def _postgres_search(terms, criteria, collapse):
+    # Every term must match, as a whole word; prefix matches on short terms would rank most of the corpus
+    tsquery = ' & '.join(terms)
+    filters, duplicate_filters = _filters(*criteria)[0], _filters(*criteria, alias='d')[0]
+    if collapse:
+        snippets = f"""CROSS JOIN LATERAL (
+                SELECT * FROM code_snippets s
+                WHERE s.content_hash = cs.hash{filters}
+                ORDER BY s.id DESC
+                LIMIT 1
+            ) s"""
+    else:
+        snippets = f"JOIN code_snippets s ON s.content_hash = cs.hash{filters}"
+    sql = f"""
+        SELECT ranked.*,
+               ts_headline('simple', cs.body, to_tsquery('simple', :tsquery),
+                           'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxFragments=2, MaxWords=20, MinWords=5') AS highlight,
+               (SELECT count(*) FROM code_snippets d
+                WHERE d.content_hash = ranked.content_hash{duplicate_filters}) - 1 AS duplicates
+        FROM (
+            SELECT s.id, s.filename, s.agent_name, s.language, s.status, s.created_at, s.content_hash,
+                   ts_rank(cs.document, to_tsquery('simple', :tsquery)) AS rank
+            FROM code_search cs
+            {snippets}
+            WHERE cs.document @@ to_tsquery('simple', :tsquery)
+            ORDER BY rank DESC, s.id DESC
+            LIMIT :limit OFFSET :offset
+        ) ranked
+        JOIN code_search cs ON cs.hash = ranked.content_hash
+        ORDER BY ranked.rank DESC, ranked.id DESC
+    """
+    return sql, {'tsquery': tsquery}
+
+def _sqlite_search(terms, criteria, collapse):
+    # Quoted terms are implicitly ANDed
+    match = ' '.join(f'"{term}"' for term in terms)
+    filters, duplicate_filters = _filters(*criteria)[0], _filters(*criteria, alias='d')[0]
+    if collapse:
+        snippets = f"""JOIN code_snippets s ON s.id = (
+                SELECT latest.id FROM code_snippets latest
+                WHERE latest.content_hash = code_search.hash{_filters(*criteria, alias='latest')[0]}
+                ORDER BY latest.id DESC
+                LIMIT 1
+            )"""
+    else:
+        snippets = f"JOIN code_snippets s ON s.content_hash = code_search.hash{filters}"
+    # Duplicates are counted for the page only, outside the ranked scan
+    sql = f"""
+        SELECT page.*,
+               (SELECT count(*) FROM code_snippets d
+                WHERE d.content_hash = page.content_hash{duplicate_filters}) - 1 AS duplicates
+        FROM (
+            SELECT s.id, s.filename, s.agent_name, s.language, s.status,
+                   s.created_at, s.content_hash,
+                   -bm25(code_search) AS rank,
+                   snippet(code_search, 1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 20) AS highlight
+            FROM code_search
+            {snippets}
+            WHERE code_search MATCH :match
+            ORDER BY bm25(code_search), s.id DESC
+            LIMIT :limit OFFSET :offset
+        ) page
+        ORDER BY page.rank DESC, page.id DESC
+    """
+    return sql, {'match': match}
+
+def search_snippets(session, query, agent_name=None, language=None, status=None, limit=20, offset=0, collapse=True):
+    """Ranked page of matching snippets, best first, as dicts with a highlighted fragment
+
+    With collapse, each unique body appears once, as its newest snippet that
+    passes the filters, and `duplicates` counts the other snippets (files saved
+    with the same content) it stands for. Without it every matching snippet is
+    listed. Returns (results, has_more).
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    criteria = (agent_name, language, status)
+    _, params = _filters(*criteria)
+    if session.bind.dialect.name == 'postgresql':
+        sql, search_params = _postgres_search(terms, criteria, collapse)
+    else:
+        sql, search_params = _sqlite_search(terms, criteria, collapse)
+    params.update(search_params, limit=limit + 1, offset=offset)
+
+    rows = session.execute(text(sql).columns(created_at=DateTime), params).mappings().all()
+    return [dict(row) for row in rows[:limit]], len(rows) > limit
@@ -1,23 +1,42 @@
 import streamlit as st
-import time
 import psutil
 import subprocess
 import sys
 import os
 import pandas as pd
 import plotly.express as px
-from agent_manager import AgentManager
-from system_monitor import SystemMonitor
 import logger_config
 import logging
-from database import init_db
-from task_scheduler import TaskScheduler
+from services import get_service
+from query_cache import query_cache
 from datetime import datetime, timedelta
-from storage_handlers import StorageManager
 import json
+from collections import deque
 
-# Initialize database
-init_db()
+# Snippet metadata rows per page in the agent Code tab; bodies load only for the selected row
+SNIPPET_PAGE_SIZE = 100
+
+# Lines of a selected snippet shown before "Show full snippet", and rendered snippets kept in memory
+SNIPPET_PREVIEW_LINES = 80
+RENDERED_SNIPPET_CACHE = 64
+
+# Characters of each conversation message shown in agent panels
+CONVERSATION_PREVIEW_CHARS = 2000
+
+# System Performance chart window and resolution
+METRICS_CHART_SECONDS = 3600
+METRICS_CHART_POINTS = 360
+
+# Panels rerun on their own on these intervals instead of rerunning the whole page;
+# database-backed panels only query again when the change feed reports a change
+REFRESH_SECONDS = 5
+METRICS_REFRESH_SECONDS = 2
+
+# Log lines kept in the System Logs panel
+LOG_PANEL_LINES = 200
+
+# Results per page in the code search panel
+SEARCH_PAGE_SIZE = 10
 
 # Page config
 st.set_page_config(
@@ -102,40 +121,84 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize managers
-agent_manager = AgentManager()
-system_monitor = SystemMonitor()
-task_scheduler = TaskScheduler()
-storage_manager = StorageManager()
-task_scheduler.start()
-
-# Sidebar Navigation
-with st.sidebar:
-    st.title("🤖 Agent Hub")
-
-    # Profile Section
-    st.image("https://picsum.photos/200", width=100)  # Placeholder profile image
-    st.subheader("Welcome back!")
-
-    # Navigation
-    selected_page = st.radio(
-        "Navigation",
-        ["Dashboard", "My Agents", "Begin Project", "Work on Project", "Project Done", "Stats & Analytics"]
+# Shared managers, built and started once per process (database migrated on first use)
+agent_manager = get_service('agent_manager')
+system_monitor = get_service('system_monitor')
+task_scheduler = get_service('task_scheduler')
+storage_manager = get_service('storage_manager')
+change_feed = get_service('change_feed')
+
+def panel_data(panel, version, loader, page=None):
+    """Data for a panel, reloaded only when its change-feed version or page moves
+
+    Only the current version and page are kept per panel, so paging through a
+    long listing doesn't grow the session state.
+    """
+    cache = st.session_state.setdefault('panel_cache', {})
+    entry = cache.get(panel)
+    if entry is None or entry[:2] != (version, page):
+        # Query-cache entries from before the version moved may predate another process's write
+        with query_cache.at_version(version):
+            entry = (version, page, loader())
+        cache[panel] = entry
+    return entry[2]
+
+def recent_conversations():
+    """Latest conversation per agent, shared by every panel in this session"""
+    scopes = [f"agent_tasks:{agent}" for agent in agent_manager.agent_names]
+    return panel_data(
+        'conversations',
+        change_feed.version(*scopes),
+        lambda: agent_manager.get_recent_conversations(agent_manager.agent_names)
     )
 
-# Main Content Area
-if selected_page == "Dashboard":
-    st.title("Dashboard Overview")
-
-    # System Metrics
+@st.cache_data(max_entries=RENDERED_SNIPPET_CACHE, show_spinner=False)
+def rendered_snippet(snippet_id, full=False):
+    """Formatted snippet text and whether it was truncated; snippets never change, so entries never go stale"""
+    snippet = agent_manager.get_code_snippet(snippet_id)
+    if snippet is None:
+        # Raised rather than returned so the miss isn't cached
+        raise LookupError(f"Snippet {snippet_id} not found")
+    text = agent_manager.format_code_snippet(snippet) or ''
+    lines = text.splitlines()
+    if full or len(lines) <= SNIPPET_PREVIEW_LINES:
+        return text, False
+    return "\n".join(lines[:SNIPPET_PREVIEW_LINES]) + "\n…", True
+
+def preview(message):
+    """Conversation message cut to CONVERSATION_PREVIEW_CHARS"""
+    if len(message) <= CONVERSATION_PREVIEW_CHARS:
+        return message
+    return message[:CONVERSATION_PREVIEW_CHARS] + "…"
+
+def format_size(size):
+    if size is None:
+        return ""
+    if size < 1024:
+        return f"{size} B"
+    return f"{size / 1024:.1f} KB"
+
+@st.fragment(run_every=METRICS_REFRESH_SECONDS)
+def metrics_panel():
+    """System metrics cards and chart, served from the in-memory sampler"""
     metrics = system_monitor.get_latest_metrics()
     if metrics:
         # Create metrics history for visualization
-        metrics_history = pd.DataFrame({
-            'Time': [metrics.timestamp],
-            'CPU': [metrics.cpu_usage],
-            'Memory': [metrics.memory_usage]
-        })
+        history = system_monitor.get_metrics_history(seconds=METRICS_CHART_SECONDS, points=METRICS_CHART_POINTS)
+        if history['timestamp']:
+            metrics_history = pd.DataFrame({
+                'Time': history['timestamp'],
+                'CPU': history['cpu_usage_mean'],
+                'CPU Peak': history['cpu_usage_max'],
+                'Memory': history['memory_usage_mean']
+            })
+        else:
+            metrics_history = pd.DataFrame({
+                'Time': [metrics.timestamp],
+                'CPU': [metrics.cpu_usage],
+                'CPU Peak': [metrics.cpu_usage],
+                'Memory': [metrics.memory_usage]
+            })
 
         # System metrics cards in a grid
         st.markdown('<div class="card-container">', unsafe_allow_html=True)
@@ -152,12 +215,178 @@ if selected_page == "Dashboard":
         st.plotly_chart(
             px.line(metrics_history,
                     x='Time',
-                    y=['CPU', 'Memory'],
+                    y=['CPU', 'CPU Peak', 'Memory'],
                     title='System Performance',
                     template='plotly_dark'),
             use_container_width=True
         )
 
+@st.fragment(run_every=REFRESH_SECONDS)
+def agent_card(agent):
+    """Status, conversation and code for one agent"""
+    st.markdown(f'<div class="card-container">', unsafe_allow_html=True)
+    st.subheader(f"🤖 {agent}")
+    status = panel_data(
+        'agent_statuses', change_feed.version('agent_status'), agent_manager.get_agent_statuses
+    )[agent]
+
+    cols = st.columns([1, 2])
+    with cols[0]:
+        st.write("Status:", "🟢 Active" if status['status'] else "🔴 Inactive")
+    with cols[1]:
+        st.write("Current Task:", status['task'])
+
+    # Show conversation history in a tab instead of nested expander
+    task_tabs = st.tabs(["Conversation", "Code"])
+
+    with task_tabs[0]:
+        conversations = recent_conversations()[agent]
+        if conversations:
+            for msg in conversations:
+                st.code(preview(msg), language="plain")
+        else:
+            st.info("No conversation history yet")
+
+    with task_tabs[1]:
+        cursor_key = f"snippet_cursor_{agent}"
+        cursor = st.session_state.get(cursor_key)
+        code_snippets, next_cursor = panel_data(
+            f"snippets_{agent}",
+            change_feed.version(f"code_snippets:{agent}"),
+            lambda: agent_manager.get_code_snippets_page(
+                agent,
+                limit=SNIPPET_PAGE_SIZE,
+                cursor=cursor
+            ),
+            page=cursor
+        )
+        if code_snippets:
+            # Metadata only; the grid renders just the rows in view
+            listing = st.dataframe(
+                pd.DataFrame({
+                    'File': [snippet.filename for snippet in code_snippets],
+                    'Language': [snippet.language for snippet in code_snippets],
+                    'Status': [snippet.status for snippet in code_snippets],
+                    'Size': [format_size(snippet.size) for snippet in code_snippets],
+                    'Created': [snippet.created_at for snippet in code_snippets]
+                }),
+                hide_index=True,
+                use_container_width=True,
+                on_select="rerun",
+                selection_mode="single-row",
+                key=f"snippet_table_{agent}_{cursor}"
+            )
+            selected = listing.selection.rows
+            if selected:
+                snippet_id = code_snippets[selected[0]].id
+                full_key = f"snippet_full_{agent}"
+                try:
+                    text, truncated = rendered_snippet(snippet_id, st.session_state.get(full_key) == snippet_id)
+                    st.code(text, language="python")
+                    if truncated and st.button("Show full snippet", key=f"show_full_{agent}"):
+                        st.session_state[full_key] = snippet_id
+                        st.rerun(scope="fragment")
+                except LookupError:
+                    st.warning("Snippet could not be loaded")
+            else:
+                st.caption("Select a snippet to view its code")
+        else:
+            st.info("No code snippets yet")
+
+        page_cols = st.columns(2)
+        with page_cols[0]:
+            if cursor and st.button("⏮ Newest", key=f"newest_{agent}"):
+                del st.session_state[cursor_key]
+                st.rerun(scope="fragment")
+        with page_cols[1]:
+            if next_cursor and st.button("Older ⏭", key=f"older_{agent}"):
+                st.session_state[cursor_key] = next_cursor
+                st.rerun(scope="fragment")
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@st.fragment
+def code_search_panel():
+    """Full-text search over every agent's code"""
+    cols = st.columns([3, 1, 1])
+    with cols[0]:
+        query = st.text_input("🔎 Search code", key="search_query")
+    with cols[1]:
+        agent = st.selectbox("Agent", ["All"] + agent_manager.agent_names, key="search_agent")
+    with cols[2]:
+        language = st.text_input("Language", key="search_language")
+    show_identical = st.checkbox("Show every file with identical content", key="search_identical")
+    if not query:
+        return
+
+    # A new search starts again from the first page
+    search = (query, agent, language, show_identical)
+    if st.session_state.get('search_key') != search:
+        st.session_state['search_key'] = search
+        st.session_state['search_pages'] = 1
+
+    results, has_more = agent_manager.search_code_snippets(
+        query,
+        agent_name=None if agent == "All" else agent,
+        language=language or None,
+        limit=SEARCH_PAGE_SIZE * st.session_state['search_pages'],
+        collapse=not show_identical
+    )
+    if not results:
+        st.info("No matching code")
+    for result in results:
+        caption = f"{result['agent_name']} · {result['filename']} · {result['created_at']:%Y-%m-%d %H:%M}"
+        if result['duplicates'] and not show_identical:
+            caption += f" · {result['duplicates']} more with identical content"
+        st.caption(caption)
+        st.code(result['highlight'], language="plain")
+    if has_more and st.button("More results", key="search_more"):
+        st.session_state['search_pages'] += 1
+        st.rerun(scope="fragment")
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def system_logs_panel():
+    """Log tail that only pulls entries newer than the last one shown"""
+    lines = st.session_state.setdefault('log_lines', deque(maxlen=LOG_PANEL_LINES))
+    entries = logger_config.get_logs_since(st.session_state.get('log_seq', 0), limit=LOG_PANEL_LINES)
+    if entries:
+        lines.extend(entry['text'] for entry in entries)
+        st.session_state['log_seq'] = entries[-1]['seq']
+    st.code("\n".join(lines))
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def agent_activity_panel():
+    conversations_by_agent = recent_conversations()
+    for agent in agent_manager.agent_names:
+        st.subheader(f"{agent}'s Recent Activities")
+        conversations = conversations_by_agent[agent]
+        if conversations:
+            for msg in conversations[:5]:  # Show only last 5 activities
+                st.code(preview(msg), language="plain")
+        else:
+            st.info("No recent activities")
+
+# Sidebar Navigation
+with st.sidebar:
+    st.title("🤖 Agent Hub")
+
+    # Profile Section
+    st.image("https://picsum.photos/200", width=100)  # Placeholder profile image
+    st.subheader("Welcome back!")
+
+    # Navigation
+    selected_page = st.radio(
+        "Navigation",
+        ["Dashboard", "My Agents", "Begin Project", "Work on Project", "Project Done", "Stats & Analytics"]
+    )
+
+# Main Content Area
+if selected_page == "Dashboard":
+    st.title("Dashboard Overview")
+
+    # System Metrics
+    metrics_panel()
+
 elif selected_page == "My Agents":
     st.title("My Agents")
 
@@ -179,38 +408,14 @@ elif selected_page == "My Agents":
             st.success("System restarted")
     st.markdown('</div>', unsafe_allow_html=True)
 
+    # Code search
+    st.markdown('<div class="card-container">', unsafe_allow_html=True)
+    code_search_panel()
+    st.markdown('</div>', unsafe_allow_html=True)
+
     # Agent Status and Tasks
     for agent in agent_manager.agent_names:
-        st.markdown(f'<div class="card-container">', unsafe_allow_html=True)
-        st.subheader(f"🤖 {agent}")
-        status = agent_manager.get_agent_statuses()[agent]
-
-        cols = st.columns([1, 2])
-        with cols[0]:
-            st.write("Status:", "🟢 Active" if status['status'] else "🔴 Inactive")
-        with cols[1]:
-            st.write("Current Task:", status['task'])
-
-        # Show conversation history in a tab instead of nested expander
-        task_tabs = st.tabs(["Conversation", "Code"])
-
-        with task_tabs[0]:
-            conversations = agent_manager.get_agent_conversation(agent)
-            if conversations:
-                for msg in conversations:
-                    st.code(msg, language="plain")
-            else:
-                st.info("No conversation history yet")
-
-        with task_tabs[1]:
-            code_snippets = agent_manager.get_code_snippets(agent)
-            if code_snippets:
-                for snippet in code_snippets:
-                    st.code(snippet.content, language="python")
-            else:
-                st.info("No code snippets yet")
-
-        st.markdown('</div>', unsafe_allow_html=True)
+        agent_card(agent)
 
 elif selected_page == "Begin Project":
     st.title("Begin New Project")
@@ -239,18 +444,7 @@ st.header("Recent Activity")
 activity_tabs = st.tabs(["System Logs", "Agent Activities"])
 
 with activity_tabs[0]:
-    st.code("\n".join(logger_config.get_recent_logs()))
+    system_logs_panel()
 
 with activity_tabs[1]:
-    for agent in agent_manager.agent_names:
-        st.subheader(f"{agent}'s Recent Activities")
-        conversations = agent_manager.get_agent_conversation(agent)
-        if conversations:
-            for msg in conversations[:5]:  # Show only last 5 activities
-                st.code(msg, language="plain")
-        else:
-            st.info("No recent activities")
-
-# Auto-refresh
-time.sleep(5)
-st.rerun()
\ No newline at end of file
+    agent_activity_panel()
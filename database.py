@@ -1,23 +1,86 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, LargeBinary, JSON
+from sqlalchemy import create_engine, inspect, text, Column, Integer, BigInteger, String, Float, DateTime, Boolean, Text, LargeBinary, JSON, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from contextlib import contextmanager
 import os
 from datetime import datetime
 
 # Get database URL from environment variable
 DATABASE_URL = os.getenv('DATABASE_URL')
 
+def _engine_options(url):
+    """Connection pool settings, tunable from the environment"""
+    options = {
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+    }
+    # SQLite uses a single-connection pool that does not accept sizing arguments
+    if make_url(url).get_backend_name() != 'sqlite':
+        options.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '20')),
+            pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        )
+    return options
+
 # Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
 
 # Create declarative base
 Base = declarative_base()
 
-# Create Session class
-Session = sessionmaker(bind=engine)
+# Create Session class; objects stay readable after the session that loaded them closes
+Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+@contextmanager
+def session_scope():
+    """Provide a transactional scope: commit on success, roll back on error, always close"""
+    session = Session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def dialect_insert(session, model):
+    """INSERT construct with ON CONFLICT support for the session's backend (Postgres or SQLite)"""
+    if session.get_bind().dialect.name == 'postgresql':
+        return pg_insert(model)
+    return sqlite_insert(model)
+
+# Postgres NOTIFY channel announcing change-feed bumps
+CHANGE_CHANNEL = 'change_feed'
+
+def bump_versions(session, *scopes):
+    """Increment the change-feed version of each scope within the caller's transaction"""
+    scopes = sorted(set(scopes))
+    if not scopes:
+        return
+    now = datetime.utcnow()
+    stmt = dialect_insert(session, ChangeVersion).values(
+        [{'scope': scope, 'version': 1, 'updated_at': now} for scope in scopes]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ChangeVersion.scope],
+        set_={'version': ChangeVersion.version + 1, 'updated_at': stmt.excluded.updated_at}
+    )
+    session.execute(stmt)
+    if session.get_bind().dialect.name == 'postgresql':
+        # Delivered to listeners only when the transaction commits
+        session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                        {'channel': CHANGE_CHANNEL, 'payload': ','.join(scopes)})
 
 class SystemMetrics(Base):
     __tablename__ = 'system_metrics'
+    __table_args__ = (
+        Index('ix_system_metrics_timestamp', 'timestamp'),
+    )
 
     id = Column(Integer, primary_key=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
@@ -25,8 +88,28 @@ class SystemMetrics(Base):
     memory_usage = Column(Float)
     ollama_status = Column(Boolean)
 
+class AgentProcessMetrics(Base):
+    """Resource usage of one agent worker process at a point in time"""
+    __tablename__ = 'agent_process_metrics'
+    __table_args__ = (
+        Index('ix_agent_process_metrics_agent_name_timestamp', 'agent_name', 'timestamp'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    agent_name = Column(String, nullable=False)  # Worker name; grouped agents share one
+    cpu_percent = Column(Float)
+    rss_bytes = Column(BigInteger)
+    read_bytes = Column(BigInteger)
+    write_bytes = Column(BigInteger)
+    num_fds = Column(Integer)
+    num_threads = Column(Integer)
+
 class AgentStatus(Base):
     __tablename__ = 'agent_status'
+    __table_args__ = (
+        UniqueConstraint('agent_name', name='uq_agent_status_agent_name'),
+    )
 
     id = Column(Integer, primary_key=True)
     agent_name = Column(String)
@@ -37,10 +120,16 @@ class AgentStatus(Base):
 
 class CodeSnippet(Base):
     __tablename__ = 'code_snippets'
+    __table_args__ = (
+        Index('ix_code_snippets_agent_name_created_at_id', 'agent_name', 'created_at', 'id'),
+        Index('ix_code_snippets_created_at_id', 'created_at', 'id'),
+        Index('ix_code_snippets_content_hash', 'content_hash'),
+    )
 
     id = Column(Integer, primary_key=True)
     filename = Column(String)
-    content = Column(Text)
+    content = Column(Text)  # Legacy inline copy, already formatted; new rows use content_hash
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the raw body in code_blobs
     language = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     agent_name = Column(String)
@@ -48,22 +137,47 @@ class CodeSnippet(Base):
     binary_data = Column(LargeBinary, nullable=True)
     file_type = Column(String)
 
+    # Attached by AgentManager, not columns: the raw body when content is requested,
+    # and the body size in bytes (characters for legacy rows) for metadata listings
+    body = None
+    size = None
+
+class CodeBlob(Base):
+    """A unique snippet body, compressed and keyed by its SHA-256"""
+    __tablename__ = 'code_blobs'
+
+    hash = Column(String(64), primary_key=True)
+    compression = Column(String, nullable=False)  # zstd, zlib or none
+    size = Column(Integer, nullable=False)  # Uncompressed length in bytes
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class AgentTask(Base):
     __tablename__ = 'agent_tasks'
+    __table_args__ = (
+        Index('ix_agent_tasks_agent_name_created_at', 'agent_name', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True)
     agent_name = Column(String)
     task_type = Column(String)  # crawl, process, deploy
-    task_status = Column(String)  # pending, running, completed, failed
+    task_status = Column(String)  # pending, running, completed, failed, cancelled
     created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
+    duration_seconds = Column(Float, nullable=True)
     result = Column(Text, nullable=True)
     error_message = Column(Text, nullable=True)
     conversation_id = Column(String)
     message_type = Column(String)
+    # TaskExecutor instance (host:pid:token) that owns a pending or running run
+    executor_id = Column(String, nullable=True)
 
 class TaskSchedule(Base):
     __tablename__ = 'task_schedules'
+    __table_args__ = (
+        Index('ix_task_schedules_is_active_next_run', 'is_active', 'next_run'),
+    )
 
     id = Column(Integer, primary_key=True)
     agent_name = Column(String)
@@ -76,6 +190,9 @@ class TaskSchedule(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     last_run = Column(DateTime, nullable=True)
     next_run = Column(DateTime)
+    # Claim held by a scheduler instance while it processes a due run
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
 
 class DeploymentLog(Base):
     __tablename__ = 'deployment_logs'
@@ -87,6 +204,13 @@ class DeploymentLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     github_url = Column(String)
 
+class ChangeVersion(Base):
+    __tablename__ = 'change_versions'
+
+    scope = Column(String, primary_key=True)  # table, or table:agent
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class WorkspaceFolder(Base):
     __tablename__ = 'workspace_folders'
 
@@ -94,6 +218,22 @@ class WorkspaceFolder(Base):
     folder_name = Column(String, unique=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-# Create all tables
+# Alembic history lives in migrations/ next to this file
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alembic.ini')
+BASELINE_REVISION = '0001'
+
 def init_db():
-    Base.metadata.create_all(engine)
\ No newline at end of file
+    """Upgrade the schema to the latest Alembic revision"""
+    # Imported here so that using the models doesn't load Alembic and its logging setup
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_INI)
+    config.set_main_option('script_location', os.path.join(os.path.dirname(ALEMBIC_INI), 'migrations'))
+    with engine.begin() as connection:
+        config.attributes['connection'] = connection
+        tables = inspect(connection).get_table_names()
+        # Databases created by create_all before migrations existed match the baseline revision
+        if 'alembic_version' not in tables and 'agent_status' in tables:
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, 'head')
@@ -0,0 +1,299 @@
+import hashlib
+import json
+import mimetypes
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from logger_config import logger
+
+# Resumable upload endpoint; point it at a stub server to test without Google
+DRIVE_UPLOAD_URL = os.getenv('DRIVE_UPLOAD_URL', 'https://www.googleapis.com/upload/drive/v3/files')
+# Metadata endpoint, used to find and create folders
+DRIVE_FILES_URL = os.getenv('DRIVE_FILES_URL', 'https://www.googleapis.com/drive/v3/files')
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Drive requires chunks in multiples of 256 KiB (except the last)
+CHUNK_ALIGNMENT = 256 * 1024
+DRIVE_CHUNK_SIZE = max(
+    CHUNK_ALIGNMENT,
+    int(os.getenv('DRIVE_CHUNK_SIZE', 8 * 1024 * 1024)) // CHUNK_ALIGNMENT * CHUNK_ALIGNMENT
+)
+
+DRIVE_MAX_RETRIES = int(os.getenv('DRIVE_MAX_RETRIES', 8))
+DRIVE_BACKOFF_MAX = float(os.getenv('DRIVE_BACKOFF_MAX', 32))
+DRIVE_UPLOAD_WORKERS = int(os.getenv('DRIVE_UPLOAD_WORKERS', 4))
+DRIVE_TIMEOUT = float(os.getenv('DRIVE_TIMEOUT', 60))
+
+# Session URIs of unfinished uploads, so a restart continues where it stopped. They
+# work without further credentials, so the directory is private and kept out of git.
+DRIVE_UPLOAD_STATE_DIR = os.getenv('DRIVE_UPLOAD_STATE_DIR', os.path.join(os.getcwd(), '.drive_uploads'))
+
+# Statuses worth retrying; Google documents these as transient for uploads
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class UploadError(Exception):
+    """An upload failed permanently or ran out of retries"""
+
+class TransientError(Exception):
+    """A request failed in a way worth retrying (network error, 429 or 5xx)"""
+
+class SessionExpired(UploadError):
+    """The resumable session is gone (404/410) and the upload must start over"""
+
+class DriveUploader:
+    """Chunked, resumable Google Drive uploads over the Drive resumable protocol
+
+    session_factory returns a requests.Session that authenticates requests (for
+    Drive, google.auth.transport.requests.AuthorizedSession); each worker thread
+    gets its own.
+    """
+
+    def __init__(self, session_factory, upload_url=None, chunk_size=None, state_dir=None, max_retries=None,
+                 files_url=None):
+        self.session_factory = session_factory
+        self.upload_url = upload_url or DRIVE_UPLOAD_URL
+        self.files_url = files_url or DRIVE_FILES_URL
+        self.chunk_size = chunk_size or DRIVE_CHUNK_SIZE
+        self.state_dir = state_dir or DRIVE_UPLOAD_STATE_DIR
+        self.max_retries = DRIVE_MAX_RETRIES if max_retries is None else max_retries
+        self._local = threading.local()
+        # (parent id, name) -> folder id; folders are looked up or created once per uploader
+        self._folders = {}
+        self._folder_lock = threading.Lock()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.session_factory()
+        return session
+
+    def _send(self, method, url, **kwargs):
+        """One request; transient failures raise TransientError"""
+        try:
+            response = self._session().request(method, url, timeout=DRIVE_TIMEOUT, **kwargs)
+        except requests.RequestException as e:
+            raise TransientError(str(e))
+        if response.status_code in RETRY_STATUSES:
+            raise TransientError(f"HTTP {response.status_code}")
+        return response
+
+    def _backoff(self, attempt, error, action):
+        """Sleep before retry `attempt` (jittered exponential), or give up once retries run out"""
+        if attempt >= self.max_retries:
+            raise UploadError(f"{action} failed after {attempt + 1} attempts: {error}")
+        delay = min(2 ** attempt + random.random(), DRIVE_BACKOFF_MAX)
+        logger.warning(f"{action} failed ({error}), retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+    def _request(self, method, url, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return self._send(method, url, **kwargs)
+            except TransientError as e:
+                self._backoff(attempt, e, f"Drive {method}")
+                attempt += 1
+
+    # Resume state
+
+    def _state_path(self, file_path, size, mtime, name, folder_id):
+        key = json.dumps([os.path.abspath(file_path), size, mtime, name, folder_id])
+        return os.path.join(self.state_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _load_state(self, state_path):
+        try:
+            with open(state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self, state_path, state):
+        os.makedirs(self.state_dir, mode=0o700, exist_ok=True)
+        temp_path = state_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, state_path)
+
+    def _clear_state(self, state_path):
+        try:
+            os.remove(state_path)
+        except FileNotFoundError:
+            pass
+
+    # Folders
+
+    def _find_folder(self, name, parent_id):
+        escaped = name.replace('\\', '\\\\').replace("'", "\\'")
+        response = self._request('GET', self.files_url, params={
+            'q': f"name = '{escaped}' and '{parent_id or 'root'}' in parents "
+                 f"and mimeType = '{FOLDER_MIME_TYPE}' and trashed = false",
+            'fields': 'files(id)'
+        })
+        if response.status_code != 200:
+            raise UploadError(f"Could not look up folder {name}: HTTP {response.status_code} {response.text[:200]}")
+        found = response.json().get('files') or []
+        return found[0]['id'] if found else None
+
+    def _create_folder(self, name, parent_id):
+        metadata = {'name': name, 'mimeType': FOLDER_MIME_TYPE}
+        if parent_id:
+            metadata['parents'] = [parent_id]
+        response = self._request('POST', self.files_url, params={'fields': 'id'}, json=metadata)
+        if response.status_code != 200:
+            raise UploadError(f"Could not create folder {name}: HTTP {response.status_code} {response.text[:200]}")
+        return response.json()['id']
+
+    def ensure_folder(self, name, parent_id=None):
+        """Id of the folder `name` under parent_id (My Drive root if None), created if missing"""
+        key = (parent_id, name)
+        # Held across the requests so concurrent callers never create the same folder twice
+        with self._folder_lock:
+            folder_id = self._folders.get(key)
+            if folder_id is None:
+                folder_id = self._find_folder(name, parent_id) or self._create_folder(name, parent_id)
+                self._folders[key] = folder_id
+        return folder_id
+
+    def ensure_folder_path(self, parts, parent_id=None):
+        """Id of the nested folder parts[0]/parts[1]/... under parent_id, creating what is missing"""
+        for name in parts:
+            parent_id = self.ensure_folder(name, parent_id)
+        return parent_id
+
+    # Protocol
+
+    def _start_session(self, name, size, mime_type, folder_id):
+        metadata = {'name': name}
+        if folder_id:
+            metadata['parents'] = [folder_id]
+        response = self._request(
+            'POST',
+            self.upload_url,
+            params={'uploadType': 'resumable', 'fields': 'id'},
+            json=metadata,
+            headers={'X-Upload-Content-Type': mime_type, 'X-Upload-Content-Length': str(size)}
+        )
+        if response.status_code != 200 or 'Location' not in response.headers:
+            raise UploadError(f"Could not start upload session: HTTP {response.status_code} {response.text[:200]}")
+        return response.headers['Location']
+
+    def _handle_response(self, response, size):
+        """Return ('done', file id) or ('partial', next offset) for a chunk or status response"""
+        if response.status_code in (200, 201):
+            return 'done', response.json().get('id')
+        if response.status_code == 308:
+            # Range: bytes=0-N is what the server has; absent means nothing yet
+            received = response.headers.get('Range')
+            return 'partial', int(received.rsplit('-', 1)[1]) + 1 if received else 0
+        if response.status_code in (404, 410):
+            raise SessionExpired(f"Upload session expired: HTTP {response.status_code}")
+        raise UploadError(f"Upload failed: HTTP {response.status_code} {response.text[:200]}")
+
+    def _query_offset(self, session_uri, size):
+        response = self._request('PUT', session_uri, headers={'Content-Range': f"bytes */{size}"})
+        return self._handle_response(response, size)
+
+    def upload(self, file_path, name=None, folder_id=None, mime_type=None, progress=None):
+        """Upload one file, resuming a persisted session if there is one; returns the Drive file id
+
+        progress(file_path, bytes_uploaded, total_bytes) is called after every chunk.
+        """
+        stat = os.stat(file_path)
+        size = stat.st_size
+        name = name or os.path.basename(file_path)
+        mime_type = mime_type or mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        state_path = self._state_path(file_path, size, stat.st_mtime, name, folder_id)
+
+        for _ in range(2):  # Once more from scratch if a saved session has expired
+            state = self._load_state(state_path)
+            try:
+                if state:
+                    session_uri = state['session_uri']
+                    status, value = self._query_offset(session_uri, size)
+                    if status == 'done':
+                        self._clear_state(state_path)
+                        return value
+                    offset = value
+                    logger.info(f"Resuming Drive upload of {file_path} at {offset}/{size} bytes")
+                else:
+                    session_uri = self._start_session(name, size, mime_type, folder_id)
+                    self._save_state(state_path, {'session_uri': session_uri, 'file_path': file_path, 'size': size})
+                    offset = 0
+                file_id = self._send_chunks(session_uri, file_path, size, offset, progress)
+                self._clear_state(state_path)
+                return file_id
+            except SessionExpired as e:
+                logger.warning(f"{e}; restarting upload of {file_path}")
+                self._clear_state(state_path)
+        raise UploadError(f"Upload session for {file_path} kept expiring")
+
+    def _send_chunks(self, session_uri, file_path, size, offset, progress):
+        attempt = 0
+        with open(file_path, 'rb') as f:
+            while True:
+                f.seek(offset)
+                chunk = f.read(self.chunk_size)
+                if size == 0:
+                    headers = {'Content-Range': 'bytes */0'}
+                else:
+                    headers = {'Content-Range': f"bytes {offset}-{offset + len(chunk) - 1}/{size}"}
+                try:
+                    status, value = self._handle_response(
+                        self._send('PUT', session_uri, data=chunk, headers=headers), size
+                    )
+                    attempt = 0
+                except TransientError as e:
+                    # The chunk may have partly landed; ask the server how much it kept
+                    self._backoff(attempt, e, f"Upload of {file_path}")
+                    attempt += 1
+                    status, value = self._query_offset(session_uri, size)
+                if status == 'done':
+                    if progress:
+                        progress(file_path, size, size)
+                    return value
+                offset = value
+                if progress:
+                    progress(file_path, offset, size)
+
+    def upload_many(self, files, folder_id=None, max_workers=None, progress=None):
+        """Upload [(file_path, name)] with a bounded pool; returns {file_path: file id or None}
+
+        An item may add a third element, the folder id for that file, overriding folder_id.
+
+        progress(file_path, bytes_uploaded, total_bytes, overall_uploaded, overall_total)
+        is called after every chunk of every file.
+        """
+        files = [(item[0], item[1], item[2] if len(item) > 2 else folder_id) for item in files]
+        totals = {file_path: os.path.getsize(file_path) for file_path, _, _ in files}
+        uploaded = dict.fromkeys(totals, 0)
+        overall_total = sum(totals.values())
+        lock = threading.Lock()
+
+        def report(file_path, done, total):
+            with lock:
+                uploaded[file_path] = done
+                overall = sum(uploaded.values())
+            if progress:
+                progress(file_path, done, total, overall, overall_total)
+
+        def upload_one(file_path, name, parent_id):
+            try:
+                return self.upload(file_path, name=name, folder_id=parent_id, progress=report)
+            except Exception as e:
+                logger.error(f"Failed to upload {file_path} to Drive: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max_workers or DRIVE_UPLOAD_WORKERS,
+                                thread_name_prefix='drive-upload') as pool:
+            futures = {
+                file_path: pool.submit(upload_one, file_path, name, parent_id)
+                for file_path, name, parent_id in files
+            }
+            results = {file_path: future.result() for file_path, future in futures.items()}
+        failed = sum(1 for file_id in results.values() if file_id is None)
+        logger.info(f"Drive upload finished: {len(results) - failed} of {len(results)} files, {overall_total} bytes")
+        return results
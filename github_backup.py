@@ -0,0 +1,200 @@
+import base64
+import hashlib
+import os
+import requests
+from github import GithubException
+from github.InputGitTreeElement import InputGitTreeElement
+from logger_config import logger
+
+# Files at least this large are streamed to the blob API instead of read into memory
+GITHUB_STREAM_THRESHOLD = int(os.getenv('GITHUB_STREAM_THRESHOLD', 1024 * 1024))
+
+# GitHub rejects blobs over 100 MB
+GITHUB_MAX_BLOB_SIZE = 100 * 1024 * 1024
+
+# Read size when hashing and streaming; a multiple of 3 so base64 pieces concatenate cleanly
+READ_SIZE = 3 * 256 * 1024
+
+def git_blob_sha(file_path, size=None):
+    """SHA-1 git assigns a file's contents as a blob, computed without loading the file"""
+    size = os.path.getsize(file_path) if size is None else size
+    digest = hashlib.sha1(f"blob {size}\0".encode())
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(READ_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class _Base64BlobBody:
+    """File-like JSON body {"encoding": "base64", "content": ...} encoded from disk piece by piece
+
+    It has a known length, so requests sends it with Content-Length, reading as it goes.
+    """
+
+    PREFIX = b'{"encoding": "base64", "content": "'
+    SUFFIX = b'"}'
+
+    def __init__(self, file_path, size):
+        self._file = open(file_path, 'rb')
+        self._length = len(self.PREFIX) + 4 * ((size + 2) // 3) + len(self.SUFFIX)
+        self._buffer = self.PREFIX
+        self._done = False
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        while not self._done and (size < 0 or len(self._buffer) < size):
+            chunk = self._file.read(READ_SIZE)
+            if chunk:
+                self._buffer += base64.b64encode(chunk)
+            else:
+                self._buffer += self.SUFFIX
+                self._done = True
+                self._file.close()
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        self._file.close()
+
+class GitHubBackup:
+    """Incremental backups of a local directory into a repo: one commit per run, changed blobs only
+
+    Local files are hashed the way git hashes blobs and compared with the tree
+    of the branch head, so a run costs three reads plus one request per new blob
+    and three writes for the tree, commit and ref update.
+    """
+
+    def __init__(self, token, branch='main'):
+        self.token = token
+        self.branch = branch
+        # (path, size, mtime) -> blob sha, so unchanged files aren't re-read on every run
+        self._hash_cache = {}
+
+    def _local_files(self, data_path, prefix):
+        """{repo path: (file path, size, mtime, mode)} for the files to back up"""
+        if os.path.isfile(data_path):
+            entries = [(data_path, prefix + os.path.basename(data_path))]
+        else:
+            entries = []
+            for root, _, filenames in os.walk(data_path):
+                for filename in filenames:
+                    file_path = os.path.join(root, filename)
+                    entries.append((file_path, prefix + os.path.relpath(file_path, data_path).replace(os.sep, '/')))
+
+        files = {}
+        for file_path, repo_path in entries:
+            if os.path.islink(file_path):
+                continue
+            stat = os.stat(file_path)
+            mode = '100755' if stat.st_mode & 0o111 else '100644'
+            files[repo_path] = (file_path, stat.st_size, stat.st_mtime, mode)
+        return files
+
+    def _blob_sha(self, file_path, size, mtime):
+        key = (file_path, size, mtime)
+        sha = self._hash_cache.get(key)
+        if sha is None:
+            sha = self._hash_cache[key] = git_blob_sha(file_path, size)
+        return sha
+
+    def _create_blob(self, repo, file_path, size):
+        if size < GITHUB_STREAM_THRESHOLD:
+            with open(file_path, 'rb') as f:
+                content = base64.b64encode(f.read()).decode('ascii')
+            return repo.create_git_blob(content, 'base64').sha
+
+        body = _Base64BlobBody(file_path, size)
+        try:
+            response = requests.post(
+                f"{repo.url}/git/blobs",
+                data=body,
+                headers={
+                    'Authorization': f"token {self.token}",
+                    'Accept': 'application/vnd.github+json',
+                    'Content-Type': 'application/json'
+                },
+                timeout=300
+            )
+        finally:
+            body.close()
+        response.raise_for_status()
+        return response.json()['sha']
+
+    def _head(self, repo):
+        """(ref, head commit, its recursive tree) of the backup branch, or Nones for an empty branch"""
+        try:
+            ref = repo.get_git_ref(f"heads/{self.branch}")
+        except GithubException as e:
+            if e.status == 409:
+                # The Git Data API refuses empty repositories; give it a first commit
+                repo.create_file('.backup', "Initialize backup repository", '', branch=self.branch)
+                ref = repo.get_git_ref(f"heads/{self.branch}")
+            elif e.status == 404:
+                return None, None, None
+            else:
+                raise
+        commit = repo.get_git_commit(ref.object.sha)
+        tree = repo.get_git_tree(commit.tree.sha, recursive=True)
+        return ref, commit, tree
+
+    def backup(self, repo, data_path, message="Automated backup", prefix='', delete_missing=False):
+        """Commit what changed in data_path since the last backup; returns the commit sha, or None if nothing changed
+
+        Files land under prefix (a repo directory such as "data/", or the root).
+        With delete_missing, files under prefix that no longer exist in the
+        data_path directory are removed; this needs a non-empty prefix the caller
+        owns, and never applies to a single file, so other paths are left alone.
+        """
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        delete_missing = delete_missing and os.path.isdir(data_path)
+        if delete_missing and not prefix:
+            raise ValueError("delete_missing needs a prefix, so the rest of the repo is left alone")
+
+        local = self._local_files(data_path, prefix)
+        ref, head, tree = self._head(repo)
+        remote = {
+            element.path: (element.sha, element.mode)
+            for element in (tree.tree if tree else [])
+            if element.type == 'blob'
+        }
+        # Blobs already in the repo under any path need no upload
+        remote_shas = {sha for sha, _ in remote.values()}
+
+        elements = []
+        for repo_path, (file_path, size, mtime, mode) in sorted(local.items()):
+            if size > GITHUB_MAX_BLOB_SIZE:
+                logger.error(f"Skipping {repo_path}: {size} bytes is over GitHub's blob limit")
+                continue
+            sha = self._blob_sha(file_path, size, mtime)
+            if remote.get(repo_path) == (sha, mode):
+                continue
+            if sha not in remote_shas:
+                # Git blob ids are content hashes, so the upload returns the sha computed locally
+                self._create_blob(repo, file_path, size)
+                remote_shas.add(sha)
+            elements.append(InputGitTreeElement(repo_path, mode, 'blob', sha=sha))
+
+        if delete_missing:
+            owned = {repo_path for repo_path in remote if repo_path.startswith(prefix)}
+            for repo_path in sorted(owned - set(local)):
+                elements.append(InputGitTreeElement(repo_path, remote[repo_path][1], 'blob', sha=None))
+
+        if not elements:
+            logger.info(f"GitHub backup of {data_path}: no changes")
+            return None
+
+        if tree:
+            new_tree = repo.create_git_tree(elements, base_tree=tree)
+        else:
+            new_tree = repo.create_git_tree(elements)
+        commit = repo.create_git_commit(message, new_tree, [head] if head else [])
+        if ref:
+            ref.edit(commit.sha)
+        else:
+            repo.create_git_ref(f"refs/heads/{self.branch}", commit.sha)
+        logger.info(f"GitHub backup of {data_path}: {len(elements)} changed paths in {commit.sha[:7]}")
+        return commit.sha
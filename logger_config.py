@@ -1,31 +1,107 @@
+import atexit
 import logging
-from collections import deque
+import logging.handlers
+import os
+import queue
 import threading
+from collections import deque
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-logger = logging.getLogger(__name__)
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_DATEFMT = '%Y-%m-%d %H:%M:%S'
+
+# Number of structured entries kept for the dashboard
+LOG_BUFFER_SIZE = int(os.getenv('LOG_BUFFER_SIZE', 5000))
 
-# Create a thread-safe circular buffer for logs
-log_buffer = deque(maxlen=100)
+# Create a thread-safe circular buffer for logs; entries carry a monotonically
+# increasing seq so readers can ask for just what they have not seen yet
+log_buffer = deque(maxlen=LOG_BUFFER_SIZE)
 log_lock = threading.Lock()
+_last_seq = 0
 
 class BufferHandler(logging.Handler):
+    """Appends structured entries to the log ring; runs on the listener thread"""
+
     def emit(self, record):
-        log_entry = self.format(record)
+        global _last_seq
+        try:
+            text = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
         with log_lock:
-            log_buffer.append(log_entry)
+            _last_seq += 1
+            log_buffer.append({
+                'seq': _last_seq,
+                'created': record.created,
+                'level': record.levelname,
+                'levelno': record.levelno,
+                'agent': getattr(record, 'agent', None),
+                'logger': record.name,
+                'message': record.getMessage(),
+                'text': text
+            })
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener with only the message merged on the caller's thread"""
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
-# Add buffer handler to logger
+# Handlers run on the listener thread; callers only pay for an unbounded queue put
+_formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATEFMT)
+_console_handler = logging.StreamHandler()
+_console_handler.setFormatter(_formatter)
 buffer_handler = BufferHandler()
-buffer_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-logger.addHandler(buffer_handler)
+buffer_handler.setFormatter(_formatter)
 
-def get_recent_logs():
-    """Get recent log entries from the buffer"""
+_log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(
+    _log_queue, _console_handler, buffer_handler, respect_handler_level=True
+)
+
+# Third-party loggers go to the console through root, as before; a no-op if root is already configured
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, datefmt=LOG_DATEFMT)
+
+# Application records go through the queue, whatever root's configuration is, and only
+# they reach the dashboard buffer; not propagating keeps them off root's console handler
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(_EnqueueHandler(_log_queue))
+logger.propagate = False
+
+log_listener.start()
+atexit.register(log_listener.stop)
+
+def _level_number(level):
+    if level is None or isinstance(level, int):
+        return level
+    return logging.getLevelName(level.upper())
+
+def get_logs_since(seq=0, level=None, agent=None, limit=None):
+    """Structured entries newer than seq, optionally filtered by minimum level and agent"""
+    levelno = _level_number(level)
+    entries = []
     with log_lock:
-        return list(log_buffer)
+        # New entries are at the right end, so this only walks what the caller hasn't seen
+        for entry in reversed(log_buffer):
+            if entry['seq'] <= seq:
+                break
+            if levelno is not None and entry['levelno'] < levelno:
+                continue
+            if agent is not None and entry['agent'] != agent:
+                continue
+            entries.append(entry)
+            if limit is not None and len(entries) >= limit:
+                break
+    entries.reverse()
+    return entries
+
+def get_last_seq():
+    """Sequence number of the newest entry in the buffer"""
+    return _last_seq
+
+def get_recent_logs(limit=100):
+    """Get recent log entries from the buffer"""
+    return [entry['text'] for entry in get_logs_since(limit=limit)]
@@ -0,0 +1,105 @@
+from array import array
+from bisect import bisect_left
+from itertools import chain
+import threading
+import time
+
+class MetricsRingBuffer:
+    """Fixed-size, array-backed ring of recent system samples
+
+    Each field is stored in its own preallocated array('d') column, so appending
+    never allocates and readers can take memoryview slices without copying.
+    """
+
+    FIELDS = ('timestamp', 'cpu_usage', 'memory_usage', 'ollama_status')
+
+    def __init__(self, capacity=3600):
+        self.capacity = capacity
+        self._columns = {field: array('d', bytes(8 * capacity)) for field in self.FIELDS}
+        self._count = 0  # Total samples ever appended
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def append(self, cpu_usage, memory_usage, ollama_status, timestamp=None):
+        """Record a sample, overwriting the oldest one once the ring is full"""
+        with self._lock:
+            slot = self._count % self.capacity
+            self._columns['timestamp'][slot] = timestamp if timestamp is not None else time.time()
+            self._columns['cpu_usage'][slot] = cpu_usage
+            self._columns['memory_usage'][slot] = memory_usage
+            self._columns['ollama_status'][slot] = 1.0 if ollama_status else 0.0
+            self._count += 1
+
+    def _range(self, seconds=None):
+        """Logical [start, end) sample range covering the last `seconds` (caller holds the lock)"""
+        end = self._count
+        start = max(0, end - self.capacity)
+        if seconds is not None and end > start:
+            timestamps = self._columns['timestamp']
+            cutoff = time.time() - seconds
+            # Timestamps are appended in order, so bisect over the logical range
+            start += bisect_left(
+                range(start, end), cutoff,
+                key=lambda i: timestamps[i % self.capacity]
+            )
+        return start, end
+
+    def _segments(self, field, start, end):
+        """memoryview slices of one column for a logical range, oldest first"""
+        view = memoryview(self._columns[field])
+        first = start % self.capacity
+        length = end - start
+        if length <= 0:
+            return []
+        if first + length <= self.capacity:
+            return [view[first:first + length]]
+        return [view[first:], view[:first + length - self.capacity]]
+
+    def views(self, seconds=None):
+        """Zero-copy views of each column, as lists of memoryview segments oldest first
+
+        The views alias the live ring: samples appended afterwards overwrite the oldest slots.
+        """
+        with self._lock:
+            start, end = self._range(seconds)
+            return {field: self._segments(field, start, end) for field in self.FIELDS}
+
+    def latest(self):
+        """Most recent sample as a dict, or None when empty"""
+        with self._lock:
+            if not self._count:
+                return None
+            slot = (self._count - 1) % self.capacity
+            return {field: self._columns[field][slot] for field in self.FIELDS}
+
+    def downsample(self, points, seconds=None):
+        """Reduce the window to at most `points` buckets with per-bucket min/max/mean
+
+        Returns a dict of lists: `timestamp` (bucket start) plus `<field>_min`,
+        `<field>_max` and `<field>_mean` for cpu_usage, memory_usage and ollama_status.
+        """
+        result = {'timestamp': []}
+        value_fields = self.FIELDS[1:]
+        for field in value_fields:
+            for stat in ('min', 'max', 'mean'):
+                result[f'{field}_{stat}'] = []
+
+        with self._lock:
+            start, end = self._range(seconds)
+            total = end - start
+            if total <= 0 or points <= 0:
+                return result
+            bucket = -(-total // points)  # ceiling division
+            columns = {field: list(chain.from_iterable(self._segments(field, start, end)))
+                       for field in self.FIELDS}
+
+        for offset in range(0, total, bucket):
+            result['timestamp'].append(columns['timestamp'][offset])
+            for field in value_fields:
+                values = columns[field][offset:offset + bucket]
+                result[f'{field}_min'].append(min(values))
+                result[f'{field}_max'].append(max(values))
+                result[f'{field}_mean'].append(sum(values) / len(values))
+        return result
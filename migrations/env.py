@@ -0,0 +1,63 @@
+from logging.config import fileConfig
+from alembic import context
+from database import Base, engine
+
+config = context.config
+
+# Only configure logging when run from the alembic CLI; init_db() passes its own connection
+if config.config_file_name is not None and 'connection' not in config.attributes:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+# Dialect-specific tables managed by hand in migrations (the FTS5 shadow tables
+# share the code_search_ prefix), so autogenerate should not try to drop them
+UNMODELED_TABLES = ('code_search',)
+
+
+def include_name(name, type_, parent_names):
+    if type_ == 'table':
+        return not any(name == table or name.startswith(f"{table}_") for table in UNMODELED_TABLES)
+    return True
+
+
+def run_migrations_offline():
+    """Emit migration SQL without a database connection"""
+    context.configure(
+        url=str(engine.url),
+        target_metadata=target_metadata,
+        include_name=include_name,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=engine.dialect.name == 'sqlite',
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _run_with_connection(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        # SQLite can only alter tables by copying them
+        render_as_batch=connection.dialect.name == 'sqlite',
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Run migrations against the shared application engine"""
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        _run_with_connection(connection)
+        return
+    with engine.connect() as connection:
+        _run_with_connection(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
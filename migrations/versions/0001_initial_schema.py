@@ -0,0 +1,100 @@
+"""Initial schema, as previously created by Base.metadata.create_all
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'system_metrics',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('timestamp', sa.DateTime()),
+        sa.Column('cpu_usage', sa.Float()),
+        sa.Column('memory_usage', sa.Float()),
+        sa.Column('ollama_status', sa.Boolean()),
+    )
+    op.create_table(
+        'agent_status',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('agent_name', sa.String()),
+        sa.Column('status', sa.Boolean()),
+        sa.Column('last_updated', sa.DateTime()),
+        sa.Column('current_task', sa.String()),
+        sa.Column('code_repository', sa.String()),
+    )
+    op.create_table(
+        'code_snippets',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('filename', sa.String()),
+        sa.Column('content', sa.Text()),
+        sa.Column('language', sa.String()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('agent_name', sa.String()),
+        sa.Column('status', sa.String()),
+        sa.Column('binary_data', sa.LargeBinary(), nullable=True),
+        sa.Column('file_type', sa.String()),
+    )
+    op.create_table(
+        'agent_tasks',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('agent_name', sa.String()),
+        sa.Column('task_type', sa.String()),
+        sa.Column('task_status', sa.String()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('conversation_id', sa.String()),
+        sa.Column('message_type', sa.String()),
+    )
+    op.create_table(
+        'task_schedules',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('agent_name', sa.String()),
+        sa.Column('task_name', sa.String()),
+        sa.Column('task_description', sa.Text()),
+        sa.Column('schedule_type', sa.String()),
+        sa.Column('schedule_time', sa.DateTime()),
+        sa.Column('parameters', sa.JSON()),
+        sa.Column('is_active', sa.Boolean()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('last_run', sa.DateTime(), nullable=True),
+        sa.Column('next_run', sa.DateTime()),
+    )
+    op.create_table(
+        'deployment_logs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('agent_name', sa.String()),
+        sa.Column('deployment_status', sa.String()),
+        sa.Column('commit_message', sa.String()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('github_url', sa.String()),
+    )
+    op.create_table(
+        'workspace_folders',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('folder_name', sa.String(), unique=True),
+        sa.Column('created_at', sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table('workspace_folders')
+    op.drop_table('deployment_logs')
+    op.drop_table('task_schedules')
+    op.drop_table('agent_tasks')
+    op.drop_table('code_snippets')
+    op.drop_table('agent_status')
+    op.drop_table('system_metrics')
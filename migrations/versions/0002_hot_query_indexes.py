@@ -0,0 +1,41 @@
+"""Indexes for the dashboard and scheduler query paths, unique agent_status.agent_name
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep only the newest row per agent before enforcing uniqueness
+    op.execute(
+        "DELETE FROM agent_status WHERE id NOT IN "
+        "(SELECT max_id FROM (SELECT MAX(id) AS max_id FROM agent_status GROUP BY agent_name) AS latest)"
+    )
+    with op.batch_alter_table('agent_status') as batch_op:
+        batch_op.create_unique_constraint('uq_agent_status_agent_name', ['agent_name'])
+
+    op.create_index('ix_agent_tasks_agent_name_created_at', 'agent_tasks', ['agent_name', 'created_at'])
+    op.create_index('ix_code_snippets_agent_name_created_at', 'code_snippets', ['agent_name', 'created_at'])
+    op.create_index('ix_task_schedules_is_active_next_run', 'task_schedules', ['is_active', 'next_run'])
+    op.create_index('ix_system_metrics_timestamp', 'system_metrics', ['timestamp'])
+
+
+def downgrade():
+    op.drop_index('ix_system_metrics_timestamp', table_name='system_metrics')
+    op.drop_index('ix_task_schedules_is_active_next_run', table_name='task_schedules')
+    op.drop_index('ix_code_snippets_agent_name_created_at', table_name='code_snippets')
+    op.drop_index('ix_agent_tasks_agent_name_created_at', table_name='agent_tasks')
+
+    with op.batch_alter_table('agent_status') as batch_op:
+        batch_op.drop_constraint('uq_agent_status_agent_name', type_='unique')
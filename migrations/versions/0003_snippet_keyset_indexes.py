@@ -0,0 +1,29 @@
+"""Keyset pagination indexes on code_snippets (created_at, id)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_code_snippets_agent_name_created_at_id', 'code_snippets', ['agent_name', 'created_at', 'id'])
+    op.create_index('ix_code_snippets_created_at_id', 'code_snippets', ['created_at', 'id'])
+    # Superseded by the wider index above
+    op.drop_index('ix_code_snippets_agent_name_created_at', table_name='code_snippets')
+
+
+def downgrade():
+    op.create_index('ix_code_snippets_agent_name_created_at', 'code_snippets', ['agent_name', 'created_at'])
+    op.drop_index('ix_code_snippets_created_at_id', table_name='code_snippets')
+    op.drop_index('ix_code_snippets_agent_name_created_at_id', table_name='code_snippets')
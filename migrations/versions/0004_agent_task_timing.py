@@ -0,0 +1,28 @@
+"""Start time and duration on agent_tasks
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('agent_tasks') as batch_op:
+        batch_op.add_column(sa.Column('started_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('duration_seconds', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('agent_tasks') as batch_op:
+        batch_op.drop_column('duration_seconds')
+        batch_op.drop_column('started_at')
@@ -0,0 +1,41 @@
+"""Per-agent worker process resource samples
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'agent_process_metrics',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('timestamp', sa.DateTime()),
+        sa.Column('agent_name', sa.String(), nullable=False),
+        sa.Column('cpu_percent', sa.Float()),
+        sa.Column('rss_bytes', sa.BigInteger()),
+        sa.Column('read_bytes', sa.BigInteger()),
+        sa.Column('write_bytes', sa.BigInteger()),
+        sa.Column('num_fds', sa.Integer()),
+        sa.Column('num_threads', sa.Integer()),
+    )
+    op.create_index(
+        'ix_agent_process_metrics_agent_name_timestamp',
+        'agent_process_metrics',
+        ['agent_name', 'timestamp']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_agent_process_metrics_agent_name_timestamp', table_name='agent_process_metrics')
+    op.drop_table('agent_process_metrics')
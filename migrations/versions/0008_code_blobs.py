@@ -0,0 +1,37 @@
+"""Content-addressed code_blobs referenced from code_snippets
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'code_blobs',
+        sa.Column('hash', sa.String(64), primary_key=True),
+        sa.Column('compression', sa.String(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime()),
+    )
+    with op.batch_alter_table('code_snippets') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(64), nullable=True))
+        batch_op.create_index('ix_code_snippets_content_hash', ['content_hash'])
+
+
+def downgrade():
+    with op.batch_alter_table('code_snippets') as batch_op:
+        batch_op.drop_index('ix_code_snippets_content_hash')
+        batch_op.drop_column('content_hash')
+    op.drop_table('code_blobs')
@@ -0,0 +1,59 @@
+"""Full-text search index over unique snippet bodies
+
+Postgres gets a table with a generated tsvector column and a GIN index; SQLite
+gets an FTS5 virtual table. Bodies already in code_blobs are indexed here.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from blob_store import decompress
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            CREATE TABLE code_search (
+                hash VARCHAR(64) PRIMARY KEY,
+                body TEXT NOT NULL,
+                document TSVECTOR GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED
+            )
+        """)
+        op.execute("CREATE INDEX ix_code_search_document ON code_search USING GIN (document)")
+    else:
+        # tokenchars keeps snake_case identifiers as single terms
+        op.execute("CREATE VIRTUAL TABLE code_search USING fts5(hash UNINDEXED, body, tokenize=\"unicode61 tokenchars '_'\")")
+
+    connection = op.get_bind()
+    blobs = sa.table('code_blobs', sa.column('hash'), sa.column('compression'), sa.column('data'))
+    last_hash = ''
+    while True:
+        rows = connection.execute(
+            sa.select(blobs.c.hash, blobs.c.compression, blobs.c.data)
+            .where(blobs.c.hash > last_hash)
+            .order_by(blobs.c.hash)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            sa.text("INSERT INTO code_search (hash, body) VALUES (:hash, :body)"),
+            [{'hash': blob_hash, 'body': decompress(codec, data).decode('utf-8')} for blob_hash, codec, data in rows]
+        )
+        last_hash = rows[-1][0]
+
+
+def downgrade():
+    op.execute("DROP TABLE code_search")
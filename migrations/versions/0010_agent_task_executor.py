@@ -0,0 +1,26 @@
+"""Executor instance that owns each agent_tasks run
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('agent_tasks') as batch_op:
+        batch_op.add_column(sa.Column('executor_id', sa.String(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('agent_tasks') as batch_op:
+        batch_op.drop_column('executor_id')
@@ -0,0 +1,102 @@
+"""Move legacy inline snippet content into code_blobs and the search index
+
+Rows saved before code_blobs kept the formatted code block in content. Where
+the block unwraps exactly (the "```python\n# filename: ...\n" header and closing
+fence around the body), the body becomes a blob and content is cleared, so
+identical bodies share storage like new saves. Anything else is stored as a blob
+as-is and keeps its inline copy for display. Either way the body is indexed.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 00:00:00
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from blob_store import content_hash, compress
+from code_search import index_blobs
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 500
+
+snippets = sa.table(
+    'code_snippets',
+    sa.column('id'), sa.column('filename'), sa.column('content'), sa.column('content_hash')
+)
+blobs = sa.table(
+    'code_blobs',
+    sa.column('hash'), sa.column('compression'), sa.column('size'), sa.column('data'), sa.column('created_at')
+)
+
+
+def unwrap(content, filename):
+    """Body of a block formatted by AgentInteraction.code_block, or None if it doesn't round-trip"""
+    header = "```python\n" + (f"# filename: {filename}\n" if filename else "")
+    footer = "\n```"
+    if content.startswith(header) and content.endswith(footer) and len(content) >= len(header) + len(footer):
+        return content[len(header):-len(footer)]
+    return None
+
+
+def upgrade():
+    connection = op.get_bind()
+    insert = pg_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+    now = datetime.utcnow()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(snippets.c.id, snippets.c.filename, snippets.c.content)
+            .where(snippets.c.id > last_id, snippets.c.content_hash == None, snippets.c.content != None)
+            .order_by(snippets.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+
+        bodies, updates = {}, []
+        for snippet_id, filename, content in rows:
+            body = unwrap(content, filename)
+            blob_hash = content_hash(content if body is None else body)
+            bodies[blob_hash] = content if body is None else body
+            updates.append({
+                'snippet_id': snippet_id,
+                'hash': blob_hash,
+                'content': content if body is None else None
+            })
+
+        blob_rows = []
+        for blob_hash, body in bodies.items():
+            data = body.encode('utf-8')
+            codec, payload = compress(data)
+            blob_rows.append({'hash': blob_hash, 'compression': codec, 'size': len(data), 'data': payload, 'created_at': now})
+        new_hashes = connection.execute(
+            insert(blobs).values(blob_rows).on_conflict_do_nothing(index_elements=['hash']).returning(blobs.c.hash)
+        ).scalars().all()
+        index_blobs(connection, {blob_hash: bodies[blob_hash] for blob_hash in new_hashes})
+
+        connection.execute(
+            snippets.update()
+            .where(snippets.c.id == sa.bindparam('snippet_id'))
+            .values(content_hash=sa.bindparam('hash'), content=sa.bindparam('content')),
+            updates
+        )
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    # Unwrapped rows stay in blob form, which the previous revision reads like any new save;
+    # rows that kept their inline copy go back to being plain legacy rows
+    op.execute(
+        snippets.update()
+        .where(snippets.c.content != None, snippets.c.content_hash != None)
+        .values(content_hash=None)
+    )
@@ -0,0 +1,147 @@
+import logging
+import logging.handlers
+import os
+import re
+import threading
+import time
+from logger_config import logger, buffer_handler
+
+# Per-agent output log rotation
+AGENT_LOG_MAX_BYTES = int(os.getenv('AGENT_LOG_MAX_BYTES', 5 * 1024 * 1024))
+AGENT_LOG_BACKUPS = int(os.getenv('AGENT_LOG_BACKUPS', 3))
+
+# Longer lines are split, so a runaway line can't grow the reader's memory
+MAX_LINE_CHARS = int(os.getenv('AGENT_LOG_MAX_LINE', 8192))
+
+# Window the line-rate counters are averaged over, in seconds
+RATE_WINDOW = 10.0
+
+# Conversation headers look like "Scout (to user):"
+HEADER_PATTERN = re.compile(r'^(\S+) \(to (\S+)\):')
+
+# Where output that can't be attributed to an agent goes
+UNROUTED = 'main'
+
+class OutputPump:
+    """Drains a process's stdout/stderr on reader threads into per-agent rotating logs"""
+
+    def __init__(self, process, agent_names, workspace_path, agent=None):
+        self.process = process
+        self.agent_names = set(agent_names)
+        self.workspace_path = workspace_path
+        self.agent = agent
+        self._loggers = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for stream_name in ('stdout', 'stderr'):
+            stream = getattr(self.process, stream_name)
+            if stream is None:
+                continue
+            thread = threading.Thread(
+                target=self._pump, args=(stream, stream_name),
+                name=f"output-pump-{self.agent or UNROUTED}-{stream_name}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def join(self, timeout=None):
+        """Wait for the readers to hit EOF, which follows process exit"""
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _log_path(self, agent):
+        if agent == UNROUTED:
+            log_dir = os.path.join(self.workspace_path, 'logs')
+        else:
+            log_dir = os.path.join(self.workspace_path, agent, 'logs')
+        os.makedirs(log_dir, exist_ok=True)
+        return os.path.join(log_dir, 'output.log')
+
+    def _logger_for(self, agent):
+        with self._lock:
+            output_logger = self._loggers.get(agent)
+            if output_logger is None:
+                output_logger = logging.getLogger(f"agent_output.{agent}")
+                output_logger.setLevel(logging.INFO)
+                # Kept off the console; the dashboard reads it from the log buffer
+                output_logger.propagate = False
+                if not output_logger.handlers:
+                    file_handler = logging.handlers.RotatingFileHandler(
+                        self._log_path(agent),
+                        maxBytes=AGENT_LOG_MAX_BYTES,
+                        backupCount=AGENT_LOG_BACKUPS,
+                        encoding='utf-8'
+                    )
+                    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(stream)s - %(message)s'))
+                    output_logger.addHandler(file_handler)
+                    output_logger.addHandler(buffer_handler)
+                self._loggers[agent] = output_logger
+                self._counters[agent] = {
+                    'lines': 0, 'bytes': 0, 'lines_per_second': 0.0,
+                    'window_start': time.monotonic(), 'window_lines': 0
+                }
+            return output_logger
+
+    def _route(self, line, current):
+        """Agent a line belongs to; a conversation header switches the stream's current agent"""
+        if self.agent:
+            return self.agent
+        match = HEADER_PATTERN.match(line)
+        if match:
+            sender, recipient = match.groups()
+            if sender in self.agent_names:
+                return sender
+            if recipient in self.agent_names:
+                return recipient
+        return current
+
+    def _count(self, agent, line):
+        now = time.monotonic()
+        with self._lock:
+            counter = self._counters[agent]
+            counter['lines'] += 1
+            counter['bytes'] += len(line)
+            counter['window_lines'] += 1
+            elapsed = now - counter['window_start']
+            if elapsed >= RATE_WINDOW:
+                counter['lines_per_second'] = counter['window_lines'] / elapsed
+                counter['window_start'] = now
+                counter['window_lines'] = 0
+
+    def _pump(self, stream, stream_name):
+        current = self.agent or UNROUTED
+        try:
+            while True:
+                line = stream.readline(MAX_LINE_CHARS)
+                if not line:
+                    break
+                line = line.rstrip('\r\n')
+                if not line:
+                    continue
+                current = self._route(line, current)
+                self._logger_for(current).info(
+                    line, extra={'agent': None if current == UNROUTED else current, 'stream': stream_name}
+                )
+                self._count(current, line)
+        except Exception as e:
+            logger.error(f"Error reading agent {stream_name}: {e}")
+        finally:
+            stream.close()
+
+    def stats(self):
+        """Line and byte totals plus recent lines per second, by agent"""
+        now = time.monotonic()
+        with self._lock:
+            stats = {}
+            for agent, counter in self._counters.items():
+                rate = counter['lines_per_second']
+                elapsed = now - counter['window_start']
+                if elapsed >= RATE_WINDOW or counter['lines'] == counter['window_lines']:
+                    # No closed window yet, or nothing has arrived to close the current one
+                    rate = counter['window_lines'] / max(elapsed, 1.0)
+                stats[agent] = {'lines': counter['lines'], 'bytes': counter['bytes'], 'lines_per_second': rate}
+            return stats
@@ -0,0 +1,130 @@
+import time
+import threading
+import urllib.request
+import urllib.error
+import psutil
+from logger_config import logger
+
+class ProcessTracker:
+    """Track the PIDs of processes whose name contains a fragment
+
+    The process table is scanned once; afterwards liveness is checked through the
+    cached psutil.Process handles (which also detect PID reuse). A full rescan only
+    happens when every cached process has exited, and at most once per
+    rescan_interval while nothing matching is running.
+    """
+
+    def __init__(self, name_fragment, rescan_interval=5.0):
+        self.name_fragment = name_fragment.lower()
+        self.rescan_interval = rescan_interval
+        self._processes = {}
+        self._last_scan = None
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        """Walk the process table for matching names (caller holds the lock)"""
+        self._processes = {}
+        for proc in psutil.process_iter(['name']):
+            name = proc.info['name'] or ''
+            if self.name_fragment in name.lower():
+                self._processes[proc.pid] = proc
+        self._last_scan = time.monotonic()
+
+    def _prune(self):
+        """Drop cached handles whose process has exited (caller holds the lock)"""
+        for pid, proc in list(self._processes.items()):
+            try:
+                alive = proc.is_running() and proc.status() != psutil.STATUS_ZOMBIE
+            except psutil.Error:
+                alive = False
+            if not alive:
+                del self._processes[pid]
+
+    def pids(self):
+        """PIDs of live matching processes, rescanning only on a cache miss"""
+        with self._lock:
+            self._prune()
+            if not self._processes:
+                recently_scanned = (
+                    self._last_scan is not None
+                    and time.monotonic() - self._last_scan < self.rescan_interval
+                )
+                if not recently_scanned:
+                    self._scan()
+            return sorted(self._processes)
+
+    def is_running(self):
+        return bool(self.pids())
+
+    def invalidate(self):
+        """Forget cached PIDs so the next check rescans, e.g. after a restart"""
+        with self._lock:
+            self._processes = {}
+            self._last_scan = None
+
+
+def probe_http(url, timeout=2.0):
+    """Return True if `url` answers with a 2xx status within `timeout` seconds"""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return 200 <= response.status < 300
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        logger.debug(f"Health probe failed for {url}: {e}")
+        return False
+
+
+class ProcessSampler:
+    """Sample resource usage of a set of named processes
+
+    psutil.Process handles are cached per PID, so cpu_percent() reports usage since
+    the previous sample, and each process is read inside oneshot() so its stats come
+    from one batch of /proc reads (or syscalls) instead of one per field.
+    """
+
+    def __init__(self):
+        self._handles = {}
+
+    def _handle(self, pid):
+        proc = self._handles.get(pid)
+        if proc is None:
+            proc = psutil.Process(pid)
+            # The first cpu_percent() call only sets the baseline
+            proc.cpu_percent(interval=None)
+            self._handles[pid] = proc
+        return proc
+
+    def sample(self, pids):
+        """Map name -> usage dict for each {name: pid}; vanished processes are skipped"""
+        samples = {}
+        for name, pid in pids.items():
+            try:
+                proc = self._handle(pid)
+                with proc.oneshot():
+                    sample = {
+                        'cpu_percent': round(proc.cpu_percent(interval=None), 2),
+                        'rss_bytes': proc.memory_info().rss,
+                        'num_threads': proc.num_threads(),
+                        'read_bytes': None,
+                        'write_bytes': None,
+                        'num_fds': None
+                    }
+                    # Not every platform exposes these
+                    try:
+                        io = proc.io_counters()
+                        sample['read_bytes'], sample['write_bytes'] = io.read_bytes, io.write_bytes
+                    except (AttributeError, psutil.AccessDenied):
+                        pass
+                    try:
+                        sample['num_fds'] = proc.num_fds() if hasattr(proc, 'num_fds') else proc.num_handles()
+                    except psutil.AccessDenied:
+                        pass
+                samples[name] = sample
+            except psutil.Error:
+                self._handles.pop(pid, None)
+
+        # Forget handles for processes no longer asked about
+        live = set(pids.values())
+        for pid in list(self._handles):
+            if pid not in live:
+                del self._handles[pid]
+        return samples
@@ -0,0 +1,138 @@
+import contextlib
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import Counter
+
+class QueryCache:
+    """Process-wide read-through cache with a TTL and explicit per-key invalidation
+
+    Keys are (method name, argument) tuples, usually (method, agent_name), where an
+    argument of None means "all agents". Concurrent misses on the same key share
+    one load, so N dashboard viewers cost one query per TTL. Cached values are
+    shared between callers and must be treated as read-only.
+
+    Loads inside at_version() are tagged with a change-feed version and only hit
+    entries loaded under the same one, so a write from another process (which
+    this process's invalidations never see) isn't served for the rest of a TTL.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('QUERY_CACHE_TTL', '5'))
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._stats = Counter()
+        # Bumped by invalidations so a load that raced one is not stored
+        self._generations = Counter()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def at_version(self, version):
+        """Within the block, treat entries loaded under any other version as misses"""
+        previous = getattr(self._local, 'version', None)
+        self._local.version = version
+        try:
+            yield
+        finally:
+            self._local.version = previous
+
+    def _lookup(self, key, version):
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic() and (version is None or entry[2] == version):
+            return True, entry[1]
+        return False, None
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Return the cached value for key, calling loader() on a miss or after expiry"""
+        version = getattr(self._local, 'version', None)
+        with self._lock:
+            found, value = self._lookup(key, version)
+            if found:
+                self._stats['hits'] += 1
+                return value
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another caller may have loaded it while we waited
+            with self._lock:
+                found, value = self._lookup(key, version)
+                if found:
+                    self._stats['hits'] += 1
+                    return value
+                self._stats['misses'] += 1
+                generation = self._generation(key)
+
+            value = loader()
+            expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+            with self._lock:
+                # Skip storing a result that an invalidation made stale mid-load
+                if self._generation(key) == generation:
+                    self._entries[key] = (expires, value, version)
+            return value
+
+    def _generation(self, key):
+        return (self._generations[key], self._generations[key[0]], self._generations[None])
+
+    def invalidate(self, method, arg=None):
+        """Drop (method, arg) and the unfiltered (method, None) entry that includes it"""
+        with self._lock:
+            for key in ((method, arg), (method, None)):
+                self._entries.pop(key, None)
+                self._generations[key] += 1
+            self._stats['invalidations'] += 1
+
+    def invalidate_method(self, method):
+        """Drop every entry cached for a method"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == method]:
+                del self._entries[key]
+            self._generations[method] += 1
+            self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations[None] += 1
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        """Hit, miss and invalidation counters plus the current entry count"""
+        with self._lock:
+            hits, misses = self._stats['hits'], self._stats['misses']
+            return {
+                'hits': hits,
+                'misses': misses,
+                'invalidations': self._stats['invalidations'],
+                'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+                'size': len(self._entries)
+            }
+
+
+# Shared by every manager in the process
+query_cache = QueryCache()
+
+def invalidate_conversations(agent_name):
+    """Drop cached conversation reads after an agent_tasks write for agent_name"""
+    query_cache.invalidate('get_agent_conversation', agent_name)
+    query_cache.invalidate_method('get_recent_conversations')
+
+def cached_query(method):
+    """Serve a read through query_cache, keyed on (method name, first argument or None)
+
+    Arguments are bound to the signature first, so get_code_snippets('Scout') and
+    get_code_snippets(agent_name='Scout') share an entry and defaults fill in the key.
+    Methods taking more than one argument are keyed on all of them.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = tuple(bound.arguments.values())[1:]
+        key = (method.__name__, arguments[0] if len(arguments) == 1 else arguments or None)
+        return query_cache.get_or_load(key, lambda: method(*bound.args, **bound.kwargs))
+    return wrapper
@@ -0,0 +1,116 @@
+import atexit
+import threading
+from logger_config import logger
+from database import init_db, engine
+from agent_manager import AgentManager
+from system_monitor import SystemMonitor
+from task_scheduler import TaskScheduler
+from storage_handlers import StorageManager
+from change_feed import ChangeFeed
+
+class ServiceRegistry:
+    """Process-wide services, each built and started once and shared by every caller
+
+    Streamlit re-executes the dashboard script on every rerun and for every browser
+    session, but imported modules live for the whole process, so services obtained
+    here survive reruns. Building is guarded by a lock, so concurrent sessions
+    never create duplicates.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._services = {}
+        self._started = []
+        self._lock = threading.RLock()
+        self._closed = False
+
+    def register(self, name, factory, start=None, stop=None, requires=()):
+        """Declare how to build, start and stop a service"""
+        self._factories[name] = (factory, start, stop, tuple(requires))
+
+    def get(self, name):
+        """Return the service, building and starting it on first use"""
+        service = self._services.get(name)
+        if service is not None:
+            return service
+
+        with self._lock:
+            if name in self._services:
+                return self._services[name]
+            if self._closed:
+                raise RuntimeError("Service registry has been shut down")
+
+            factory, start, stop, requires = self._factories[name]
+            for dependency in requires:
+                self.get(dependency)
+
+            service = factory()
+            if start:
+                start(service)
+            self._services[name] = service
+            self._started.append(name)
+            logger.info(f"Service started: {name}")
+            return service
+
+    def shutdown(self):
+        """Stop services in reverse start order; safe to call more than once"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for name in reversed(self._started):
+                stop = self._factories[name][2]
+                if stop:
+                    try:
+                        stop(self._services[name])
+                        logger.info(f"Service stopped: {name}")
+                    except Exception as e:
+                        logger.error(f"Error stopping service {name}: {e}")
+            self._started.clear()
+            self._services.clear()
+
+
+def _init_database():
+    init_db()
+    return engine
+
+def _stop_scheduler(scheduler):
+    scheduler.stop()
+    scheduler.executor.shutdown(wait=False)
+
+registry = ServiceRegistry()
+registry.register('database', _init_database, stop=lambda db_engine: db_engine.dispose())
+registry.register(
+    'agent_manager', AgentManager,
+    stop=lambda manager: manager.stop_agents(),
+    requires=('database',)
+)
+registry.register(
+    'system_monitor', lambda: SystemMonitor(agent_pids=registry.get('agent_manager').get_agent_pids),
+    start=lambda monitor: monitor.start_sampler(),
+    stop=lambda monitor: monitor.stop_sampler(),
+    requires=('database', 'agent_manager')
+)
+registry.register(
+    'task_scheduler', lambda: TaskScheduler(change_feed=registry.get('change_feed')),
+    start=lambda scheduler: scheduler.start(),
+    stop=_stop_scheduler,
+    requires=('database', 'change_feed')
+)
+registry.register('storage_manager', StorageManager)
+registry.register(
+    'change_feed', ChangeFeed,
+    start=lambda feed: feed.start(),
+    stop=lambda feed: feed.stop(),
+    requires=('database',)
+)
+
+def get_service(name):
+    """Shortcut for registry.get()"""
+    return registry.get(name)
+
+def shutdown_services():
+    """Stop background threads and close pooled connections"""
+    registry.shutdown()
+
+atexit.register(shutdown_services)
@@ -1,18 +1,25 @@
 import os
 from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+from google.auth.transport.requests import Request, AuthorizedSession
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from github import Github
+from github import Github, GithubException
 from logger_config import logger
 import streamlit as st
 from requests_oauthlib import OAuth2Session
 import json
+from drive_uploader import DriveUploader
+from github_backup import GitHubBackup
 
 class StorageManager:
     def __init__(self):
         self.gdrive_service = None
+        self.gdrive_credentials = None
+        self.drive_uploader = None
         self.github_client = None
+        self.github_backup = None
+        # GitHub handles reused across backups
+        self._github_user = None
+        self._backup_repos = {}
 
         # GitHub OAuth settings
         self.github_client_id = os.getenv('GITHUB_CLIENT_ID')
@@ -70,6 +77,9 @@ class StorageManager:
             )
             st.session_state['github_token'] = token
             self.github_client = Github(token['access_token'])
+            self.github_backup = GitHubBackup(token['access_token'])
+            self._github_user = None
+            self._backup_repos = {}
             return True
         except Exception as e:
             logger.error(f"Failed to handle GitHub callback: {e}")
@@ -85,61 +95,97 @@ class StorageManager:
             )
             flow.fetch_token(code=code)
             self.gdrive_service = build('drive', 'v3', credentials=flow.credentials)
+            self.gdrive_credentials = flow.credentials
+            # Chunked resumable uploads; each upload thread gets its own authorized session
+            self.drive_uploader = DriveUploader(lambda: AuthorizedSession(self.gdrive_credentials))
             st.session_state['gdrive_credentials'] = flow.credentials.to_json()
             return True
         except Exception as e:
             logger.error(f"Failed to handle Google Drive callback: {e}")
             return False
 
-    def upload_to_drive(self, file_path, folder_id=None):
-        """Upload a file to Google Drive"""
+    def upload_to_drive(self, file_path, folder_id=None, progress=None):
+        """Upload a file to Google Drive in resumable chunks"""
         try:
-            if not self.gdrive_service:
+            if not self.drive_uploader:
                 return None
 
-            file_metadata = {'name': os.path.basename(file_path)}
-            if folder_id:
-                file_metadata['parents'] = [folder_id]
+            file_id = self.drive_uploader.upload(file_path, folder_id=folder_id, progress=progress)
+            logger.info(f"File uploaded to Drive: {file_id}")
+            return file_id
+        except Exception as e:
+            logger.error(f"Failed to upload to Drive: {e}")
+            return None
 
-            media = MediaFileUpload(file_path)
-            file = self.gdrive_service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id'
-            ).execute()
+    def upload_many_to_drive(self, paths, folder_id=None, progress=None):
+        """Upload files, or every file under directories, concurrently; returns {file_path: file id or None}
 
-            logger.info(f"File uploaded to Drive: {file.get('id')}")
-            return file.get('id')
+        A directory's contents go into folder_id with its subdirectories recreated
+        as Drive folders, so files keep their own names and never collide.
+        """
+        try:
+            if not self.drive_uploader:
+                return {}
+
+            files = []
+            for path in paths:
+                if os.path.isdir(path):
+                    for root, _, filenames in os.walk(path):
+                        relative = os.path.relpath(root, path)
+                        parts = [] if relative == '.' else relative.split(os.sep)
+                        parent_id = self.drive_uploader.ensure_folder_path(parts, folder_id)
+                        files.extend((os.path.join(root, filename), filename, parent_id) for filename in filenames)
+                else:
+                    files.append((path, os.path.basename(path), folder_id))
+            return self.drive_uploader.upload_many(files, progress=progress)
         except Exception as e:
             logger.error(f"Failed to upload to Drive: {e}")
-            return None
+            return {}
+
+    def _get_backup_repo(self, agent_name):
+        """The agent's backup repository, created on first use; looked up once per session"""
+        repo_name = f"agent-{agent_name}-backup"
+        repo = self._backup_repos.get(repo_name)
+        if repo is None:
+            if self._github_user is None:
+                self._github_user = self.github_client.get_user()
+            try:
+                repo = self._github_user.get_repo(repo_name)
+            except GithubException as e:
+                if e.status != 404:
+                    raise
+                repo = self._github_user.create_repo(
+                    repo_name,
+                    description=f"Backup repository for {agent_name}",
+                    auto_init=True
+                )
+            self._backup_repos[repo_name] = repo
+        return repo
 
     def backup_agent_data(self, agent_name, data_path):
         """Backup agent data to both Drive and GitHub"""
         try:
-            # Upload to Drive if authenticated
-            if self.gdrive_service:
-                drive_id = self.upload_to_drive(data_path)
-                logger.info(f"Backed up to Drive: {drive_id}")
-
-            # Push to GitHub if authenticated
-            if self.github_client:
-                repo_name = f"agent-{agent_name}-backup"
-                user = self.github_client.get_user()
-                try:
-                    repo = user.get_repo(repo_name)
-                except:
-                    repo = user.create_repo(repo_name, description=f"Backup repository for {agent_name}")
-
-                with open(data_path, 'r') as file:
-                    content = file.read()
-
-                repo.create_file(
-                    os.path.basename(data_path),
-                    "Automated backup",
-                    content
-                )
-                logger.info(f"Backed up to GitHub: {repo_name}")
+            # Upload to Drive if authenticated, into the agent's own folder
+            if self.drive_uploader:
+                folder_id = self.drive_uploader.ensure_folder(f"agent-{agent_name}-backup")
+                uploaded = self.upload_many_to_drive([data_path], folder_id=folder_id)
+                failed = [file_path for file_path, file_id in uploaded.items() if file_id is None]
+                logger.info(f"Backed up {len(uploaded) - len(failed)} files to Drive")
+                if failed:
+                    logger.error(f"Drive backup incomplete, {len(failed)} files failed; rerun to resume")
+
+            # Push to GitHub if authenticated; only files changed since the last backup are sent
+            if self.github_backup:
+                repo = self._get_backup_repo(agent_name)
+                if os.path.isdir(data_path):
+                    # The directory is mirrored under its own name, deletions included
+                    self.github_backup.backup(
+                        repo, data_path, "Automated backup",
+                        prefix=os.path.basename(os.path.normpath(data_path)), delete_missing=True
+                    )
+                else:
+                    self.github_backup.backup(repo, data_path, "Automated backup")
+                logger.info(f"Backed up to GitHub: {repo.name}")
 
             return True
         except Exception as e:
@@ -1,26 +1,62 @@
 import psutil
 import subprocess
 import time
+import threading
+import os
+from sqlalchemy import insert, func
 from logger_config import logger
-from database import Session, SystemMetrics
-from datetime import datetime
+from database import session_scope, SystemMetrics, AgentProcessMetrics
+from metrics_buffer import MetricsRingBuffer
+from process_tracker import ProcessTracker, ProcessSampler, probe_http
+from query_cache import query_cache, cached_query
+from datetime import datetime, timedelta
 
 class SystemMonitor:
+    def __init__(self, sample_period=None, flush_interval=None, agent_pids=None, agent_sample_period=None):
+        # Seconds between background samples and between batched inserts
+        self.sample_period = sample_period or float(os.getenv('METRICS_SAMPLE_PERIOD', '1'))
+        self.flush_interval = flush_interval or float(os.getenv('METRICS_FLUSH_INTERVAL', '60'))
+
+        # Callable returning {agent worker name: pid}; its processes are sampled less often
+        self.agent_pids = agent_pids
+        self.agent_sample_period = agent_sample_period or float(os.getenv('AGENT_METRICS_SAMPLE_PERIOD', '5'))
+        self.agent_sampler = ProcessSampler()
+        self._pending_agent_samples = []
+        self._latest_agent_samples = {}
+
+        self.sampler_thread = None
+        self._stop_sampler = threading.Event()
+        self._sample_lock = threading.Lock()
+        self._pending_samples = []
+        self._latest_sample = None
+
+        # Cached Ollama PIDs; the process table is only rescanned on a miss
+        self.ollama_tracker = ProcessTracker('ollama')
+        self.ollama_url = os.getenv('OLLAMA_HOST', 'http://127.0.0.1:11434').rstrip('/')
+
+        # Recent samples for charts; an hour at the default 1 s period
+        self.history = MetricsRingBuffer(int(os.getenv('METRICS_HISTORY_SIZE', '3600')))
+
+        # Prime psutil so the first non-blocking cpu_percent() call has a baseline
+        psutil.cpu_percent(interval=None)
+
     def check_ollama_status(self):
         """Check if Ollama is running"""
         try:
-            for proc in psutil.process_iter(['name']):
-                if 'ollama' in proc.info['name'].lower():
-                    return True
-            return False
+            return self.ollama_tracker.is_running()
         except Exception as e:
             logger.error(f"Error checking Ollama status: {e}")
             return False
 
+    def check_ollama_health(self, timeout=2.0):
+        """Check that the Ollama HTTP API answers, not just that the process exists"""
+        return probe_http(f"{self.ollama_url}/api/version", timeout=timeout)
+
     def get_cpu_usage(self):
         """Get current CPU usage"""
         try:
-            return round(psutil.cpu_percent(interval=1), 2)
+            # Non-blocking: usage since the previous call
+            return round(psutil.cpu_percent(interval=None), 2)
         except Exception as e:
             logger.error(f"Error getting CPU usage: {e}")
             return 0.0
@@ -36,27 +72,170 @@ class SystemMonitor:
     def store_metrics(self):
         """Store current system metrics in database"""
         try:
-            session = Session()
             metrics = SystemMetrics(
                 cpu_usage=self.get_cpu_usage(),
                 memory_usage=self.get_memory_usage(),
                 ollama_status=self.check_ollama_status()
             )
-            session.add(metrics)
-            session.commit()
-            session.close()
+            with session_scope() as session:
+                session.add(metrics)
+            query_cache.invalidate('get_latest_stored_metrics')
             logger.info("System metrics stored in database")
         except Exception as e:
             logger.error(f"Error storing metrics: {e}")
 
+    def start_sampler(self):
+        """Start sampling metrics in a background thread"""
+        if not self.sampler_thread or not self.sampler_thread.is_alive():
+            self._stop_sampler.clear()
+            self.sampler_thread = threading.Thread(target=self._run_sampler)
+            self.sampler_thread.daemon = True
+            self.sampler_thread.start()
+            logger.info("Metrics sampler started")
+
+    def stop_sampler(self):
+        """Stop the sampler and write any buffered samples"""
+        self._stop_sampler.set()
+        if self.sampler_thread:
+            self.sampler_thread.join()
+            self.sampler_thread = None
+            logger.info("Metrics sampler stopped")
+        self.flush_metrics()
+
+    def _run_sampler(self):
+        """Sampler loop: take a sample every period, batch-insert every flush interval"""
+        last_flush = last_agent_sample = time.monotonic()
+        while not self._stop_sampler.is_set():
+            sample = self._take_sample()
+            with self._sample_lock:
+                self._latest_sample = sample
+                self._pending_samples.append(sample)
+            self.history.append(sample['cpu_usage'], sample['memory_usage'], sample['ollama_status'])
+
+            if self.agent_pids and time.monotonic() - last_agent_sample >= self.agent_sample_period:
+                self._take_agent_samples()
+                last_agent_sample = time.monotonic()
+
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self.flush_metrics()
+                last_flush = time.monotonic()
+
+            self._stop_sampler.wait(self.sample_period)
+
+    def _take_sample(self):
+        return {
+            'timestamp': datetime.utcnow(),
+            'cpu_usage': self.get_cpu_usage(),
+            'memory_usage': self.get_memory_usage(),
+            'ollama_status': self.check_ollama_status()
+        }
+
+    def _take_agent_samples(self):
+        """Sample every agent worker process and buffer one row per worker"""
+        try:
+            timestamp = datetime.utcnow()
+            samples = self.agent_sampler.sample(self.agent_pids())
+        except Exception as e:
+            logger.error(f"Error sampling agent processes: {e}")
+            return
+        rows = [
+            {'timestamp': timestamp, 'agent_name': agent_name, **sample}
+            for agent_name, sample in samples.items()
+        ]
+        with self._sample_lock:
+            self._latest_agent_samples = {row['agent_name']: row for row in rows}
+            self._pending_agent_samples.extend(rows)
+
+    def flush_metrics(self):
+        """Insert all buffered samples into system_metrics and agent_process_metrics in one batch each"""
+        with self._sample_lock:
+            samples, self._pending_samples = self._pending_samples, []
+            agent_samples, self._pending_agent_samples = self._pending_agent_samples, []
+        if not samples and not agent_samples:
+            return
+        try:
+            with session_scope() as session:
+                if samples:
+                    session.execute(insert(SystemMetrics), samples)
+                if agent_samples:
+                    session.execute(insert(AgentProcessMetrics), agent_samples)
+            query_cache.invalidate('get_latest_stored_metrics')
+        except Exception as e:
+            logger.error(f"Error flushing metrics: {e}")
+
+    def get_latest_sample(self):
+        """Get the most recent in-memory sample, or None before the sampler has run"""
+        with self._sample_lock:
+            return dict(self._latest_sample) if self._latest_sample else None
+
+    def get_metrics_history(self, seconds=3600, points=300):
+        """Downsampled min/max/mean history from the in-memory ring buffer"""
+        history = self.history.downsample(points, seconds)
+        history['timestamp'] = [datetime.utcfromtimestamp(ts) for ts in history['timestamp']]
+        return history
+
+    def get_agent_metrics(self):
+        """Latest in-memory resource sample of each agent worker"""
+        with self._sample_lock:
+            return {name: dict(row) for name, row in self._latest_agent_samples.items()}
+
+    def get_agent_metrics_history(self, agent_name, seconds=3600):
+        """Stored resource samples for one agent worker over the last `seconds`"""
+        try:
+            since = datetime.utcnow() - timedelta(seconds=seconds)
+            with session_scope() as session:
+                return session.query(AgentProcessMetrics).filter(
+                    AgentProcessMetrics.agent_name == agent_name,
+                    AgentProcessMetrics.timestamp >= since
+                ).order_by(AgentProcessMetrics.timestamp).all()
+        except Exception as e:
+            logger.error(f"Error getting agent metrics history: {e}")
+            return []
+
+    def get_agent_usage_summary(self, seconds=86400):
+        """Mean and peak CPU and memory per agent worker over the last `seconds`, for capacity planning"""
+        try:
+            since = datetime.utcnow() - timedelta(seconds=seconds)
+            with session_scope() as session:
+                rows = session.query(
+                    AgentProcessMetrics.agent_name,
+                    func.avg(AgentProcessMetrics.cpu_percent),
+                    func.max(AgentProcessMetrics.cpu_percent),
+                    func.avg(AgentProcessMetrics.rss_bytes),
+                    func.max(AgentProcessMetrics.rss_bytes),
+                    func.count()
+                ).filter(
+                    AgentProcessMetrics.timestamp >= since
+                ).group_by(AgentProcessMetrics.agent_name).all()
+            return {
+                agent_name: {
+                    'cpu_mean': cpu_mean,
+                    'cpu_max': cpu_max,
+                    'rss_mean': rss_mean,
+                    'rss_max': rss_max,
+                    'samples': samples
+                }
+                for agent_name, cpu_mean, cpu_max, rss_mean, rss_max, samples in rows
+            }
+        except Exception as e:
+            logger.error(f"Error getting agent usage summary: {e}")
+            return {}
+
     def get_latest_metrics(self):
+        """Get latest metrics, from the sampler when running, otherwise from the database"""
+        sample = self.get_latest_sample()
+        if sample:
+            return SystemMetrics(**sample)
+        return self.get_latest_stored_metrics()
+
+    @cached_query
+    def get_latest_stored_metrics(self):
         """Get latest metrics from database"""
         try:
-            session = Session()
-            metrics = session.query(SystemMetrics).order_by(
-                SystemMetrics.timestamp.desc()
-            ).first()
-            session.close()
+            with session_scope() as session:
+                metrics = session.query(SystemMetrics).order_by(
+                    SystemMetrics.timestamp.desc()
+                ).first()
             return metrics
         except Exception as e:
             logger.error(f"Error getting latest metrics: {e}")
@@ -72,6 +251,7 @@ class SystemMonitor:
             subprocess.run(["ollama", "start"], 
                          stdout=subprocess.DEVNULL, 
                          stderr=subprocess.DEVNULL)
+            self.ollama_tracker.invalidate()
             logger.info("Ollama restarted successfully")
             return True
         except Exception as e:
@@ -0,0 +1,228 @@
+import os
+import socket
+import threading
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import psutil
+from database import session_scope, bump_versions, AgentTask
+from logger_config import logger
+from query_cache import invalidate_conversations
+
+def default_handler(agent_name, task_name, parameters):
+    """Fallback for tasks without a registered handler"""
+    return f"Executed scheduled task: {task_name}"
+
+class TaskExecutor:
+    """Runs task handlers on a thread pool, capping concurrent tasks per agent
+
+    Handlers are looked up by task name, then by the `type` parameter, then by
+    task type, and are called as handler(agent_name, task_name, parameters).
+    Their return value is stored as the task result; an exception marks it failed.
+    """
+
+    def __init__(self, max_workers=None, per_agent_limit=None):
+        self.max_workers = max_workers or int(os.getenv('TASK_EXECUTOR_WORKERS', '8'))
+        self.per_agent_limit = per_agent_limit or int(os.getenv('TASK_EXECUTOR_PER_AGENT', '2'))
+        self.agent_limits = {}
+        self._handlers = {}
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='task-executor')
+        self._lock = threading.Lock()
+        self._running = defaultdict(int)
+        self._queued = defaultdict(deque)
+        self._closed = False
+        # Stamped on the runs this instance owns, so a later start can tell which were abandoned
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def register(self, key, handler):
+        """Register a handler for a task name or task type"""
+        self._handlers[key] = handler
+
+    def handler(self, key):
+        """Decorator form of register()"""
+        def decorator(func):
+            self.register(key, func)
+            return func
+        return decorator
+
+    def set_agent_limit(self, agent_name, limit):
+        """Override the concurrency cap for one agent"""
+        with self._lock:
+            self.agent_limits[agent_name] = limit
+        self._dispatch(agent_name)
+
+    def _limit_for(self, agent_name):
+        return self.agent_limits.get(agent_name, self.per_agent_limit)
+
+    def _resolve(self, job):
+        parameters = job['parameters'] or {}
+        for key in (job['task_name'], parameters.get('type'), job['task_type']):
+            if key in self._handlers:
+                return self._handlers[key]
+        return default_handler
+
+    def submit(self, agent_name, task_name, parameters=None, task_type='scheduled', agent_task_id=None):
+        """Queue a task for execution and return the id of its AgentTask record
+
+        Pass agent_task_id to run against a record created elsewhere (e.g. in the
+        scheduler's transaction); otherwise a pending record is created here.
+        """
+        if agent_task_id is None:
+            with session_scope() as session:
+                agent_task = AgentTask(
+                    agent_name=agent_name,
+                    task_type=task_type,
+                    task_status='pending',
+                    result=f"Executing scheduled task: {task_name}",
+                    executor_id=self.instance_id
+                )
+                session.add(agent_task)
+                bump_versions(session, f'agent_tasks:{agent_name}')
+                session.flush()
+                agent_task_id = agent_task.id
+            invalidate_conversations(agent_name)
+
+        job = {
+            'agent_task_id': agent_task_id,
+            'agent_name': agent_name,
+            'task_name': task_name,
+            'task_type': task_type,
+            'parameters': parameters
+        }
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._queued[agent_name].append(job)
+        if closed:
+            self._cancel([job])
+        else:
+            self._dispatch(agent_name)
+        return agent_task_id
+
+    def _dispatch(self, agent_name):
+        """Start queued jobs for an agent while it is under its cap"""
+        with self._lock:
+            queue = self._queued[agent_name]
+            while not self._closed and queue and self._running[agent_name] < self._limit_for(agent_name):
+                job = queue.popleft()
+                self._running[agent_name] += 1
+                self._pool.submit(self._run, job)
+
+    def _run(self, job):
+        started_at = datetime.utcnow()
+        status, result, error = 'completed', None, None
+        try:
+            self._record(job, task_status='running', started_at=started_at)
+            output = self._resolve(job)(job['agent_name'], job['task_name'], job['parameters'] or {})
+            result = None if output is None else str(output)
+        except Exception as e:
+            status, error = 'failed', str(e)
+            logger.error(f"Task {job['task_name']} for agent {job['agent_name']} failed: {e}",
+                         extra={'agent': job['agent_name']})
+        finally:
+            completed_at = datetime.utcnow()
+            values = {
+                'task_status': status,
+                'completed_at': completed_at,
+                'duration_seconds': (completed_at - started_at).total_seconds(),
+                'error_message': error
+            }
+            if result is not None:
+                values['result'] = result
+            self._record(job, **values)
+
+            with self._lock:
+                self._running[job['agent_name']] -= 1
+            self._dispatch(job['agent_name'])
+
+        logger.info(f"Task {job['task_name']} for agent {job['agent_name']} {status} "
+                    f"in {values['duration_seconds']:.2f}s", extra={'agent': job['agent_name']})
+
+    def _record(self, job, **values):
+        try:
+            with session_scope() as session:
+                session.query(AgentTask).filter(AgentTask.id == job['agent_task_id']).update(values)
+                bump_versions(session, f"agent_tasks:{job['agent_name']}")
+            invalidate_conversations(job['agent_name'])
+        except Exception as e:
+            logger.error(f"Error recording task {job['agent_task_id']}: {e}")
+
+    def stats(self):
+        """Running and queued task counts per agent"""
+        with self._lock:
+            agents = set(self._running) | set(self._queued)
+            return {
+                agent: {'running': self._running[agent], 'queued': len(self._queued[agent])}
+                for agent in agents
+            }
+
+    def _cancel(self, jobs):
+        """Mark runs that will never start as cancelled"""
+        if not jobs:
+            return
+        try:
+            with session_scope() as session:
+                session.query(AgentTask).filter(
+                    AgentTask.id.in_([job['agent_task_id'] for job in jobs])
+                ).update({
+                    'task_status': 'cancelled',
+                    'completed_at': datetime.utcnow(),
+                    'error_message': "Cancelled: executor shut down before the task started"
+                }, synchronize_session=False)
+                bump_versions(session, *(f"agent_tasks:{job['agent_name']}" for job in jobs))
+            for agent_name in {job['agent_name'] for job in jobs}:
+                invalidate_conversations(agent_name)
+            logger.info(f"Cancelled {len(jobs)} queued tasks on shutdown")
+        except Exception as e:
+            logger.error(f"Error cancelling queued tasks: {e}")
+
+    def recover_orphans(self):
+        """Fail pending or running runs left behind by executors on this host that have exited
+
+        Runs owned by live processes, or by other hosts, are left alone; their own
+        executor finishes or cancels them. Returns the number of runs failed.
+        """
+        try:
+            with session_scope() as session:
+                rows = session.query(AgentTask.id, AgentTask.agent_name, AgentTask.executor_id).filter(
+                    AgentTask.task_status.in_(('pending', 'running'))
+                ).all()
+                orphans = [(task_id, agent_name, owner) for task_id, agent_name, owner in rows
+                           if self._is_orphaned(owner)]
+                if not orphans:
+                    return 0
+                session.query(AgentTask).filter(
+                    AgentTask.id.in_([task_id for task_id, _, _ in orphans])
+                ).update({
+                    'task_status': 'failed',
+                    'completed_at': datetime.utcnow(),
+                    'error_message': "Abandoned: the executor process exited before the task finished"
+                }, synchronize_session=False)
+                agents = {agent_name for _, agent_name, _ in orphans}
+                bump_versions(session, *(f"agent_tasks:{agent_name}" for agent_name in agents))
+            for agent_name in agents:
+                invalidate_conversations(agent_name)
+            logger.warning(f"Marked {len(orphans)} abandoned task runs as failed")
+            return len(orphans)
+        except Exception as e:
+            logger.error(f"Error recovering abandoned tasks: {e}")
+            return 0
+
+    def _is_orphaned(self, owner):
+        if owner is None:
+            # Recorded before runs had owners; nothing can still be working on them
+            return True
+        host, pid, _ = owner.rsplit(':', 2)
+        if host != socket.gethostname() or owner == self.instance_id:
+            return False
+        return not psutil.pid_exists(int(pid))
+
+    def shutdown(self, wait=True):
+        """Stop accepting work; queued jobs that have not started are marked cancelled"""
+        with self._lock:
+            self._closed = True
+            dropped = [job for queue in self._queued.values() for job in queue]
+            self._queued.clear()
+        self._cancel(dropped)
+        self._pool.shutdown(wait=wait)
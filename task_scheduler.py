@@ -1,18 +1,101 @@
 import schedule
 import time
 import threading
+import heapq
+import os
+import socket
+import uuid
+import calendar
 from datetime import datetime, timedelta
-from database import Session, TaskSchedule, AgentTask
+from sqlalchemy import insert, update, or_
+from database import session_scope, bump_versions, TaskSchedule, AgentTask, ChangeVersion
+from task_executor import TaskExecutor
 from logger_config import logger
+from query_cache import query_cache, cached_query, invalidate_conversations
+
+# Recurring schedule types; anything else runs once
+SCHEDULE_TYPES = ('daily', 'weekly', 'monthly')
+
+# What to do with runs missed while the scheduler was down or busy:
+#   coalesce - run once, then continue from the next future slot
+#   catch_up - record one run per missed slot, up to max_catch_up
+#   skip     - drop runs later than misfire_grace seconds, then continue
+MISFIRE_POLICIES = ('coalesce', 'catch_up', 'skip')
+
+def add_months(value, months):
+    """Shift a datetime by whole months, clamping the day to the target month's length"""
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+def occurrence(anchor, schedule_type, index):
+    """The index-th run of a recurring schedule that started at anchor"""
+    if schedule_type == 'daily':
+        return anchor + timedelta(days=index)
+    if schedule_type == 'weekly':
+        return anchor + timedelta(weeks=index)
+    return add_months(anchor, index)
+
+def occurrence_index_after(anchor, schedule_type, moment):
+    """Index of the first run strictly after moment"""
+    if moment < anchor:
+        return 0
+    if schedule_type in ('daily', 'weekly'):
+        step = timedelta(days=1) if schedule_type == 'daily' else timedelta(weeks=1)
+        return (moment - anchor) // step + 1
+    index = (moment.year - anchor.year) * 12 + moment.month - anchor.month
+    while index > 0 and occurrence(anchor, schedule_type, index - 1) > moment:
+        index -= 1
+    while occurrence(anchor, schedule_type, index) <= moment:
+        index += 1
+    return index
 
 class TaskScheduler:
-    def __init__(self):
+    def __init__(self, reload_interval=None, executor=None, misfire_policy=None,
+                 misfire_grace=None, max_catch_up=None, batch_size=None, change_feed=None):
         self.scheduler_thread = None
         self.is_running = False
+
+        # Due tasks are recorded here and handed to the executor to run
+        self.executor = executor or TaskExecutor()
+
+        # Min-heap of (next_run, task_id) for every active schedule
+        self._heap = []
+        # Current deadline per task id; heap entries that disagree are stale
+        self._next_runs = {}
+        self._wakeup = threading.Condition()
+        self._needs_reload = True
+        self._fingerprint = None
+        self._last_change_check = 0.0
+        self._change_signalled = False
+
+        # Without a change feed, how often to look for schedules changed outside this scheduler
+        self.reload_interval = reload_interval or float(os.getenv('SCHEDULER_RELOAD_INTERVAL', '30'))
+        # With one, other processes' changes wake the loop as soon as the feed hears of them
+        self.change_feed = change_feed
+        if change_feed:
+            change_feed.subscribe(('task_schedules',), self._on_schedules_changed)
+
+        self.misfire_policy = misfire_policy or os.getenv('SCHEDULER_MISFIRE_POLICY', 'coalesce')
+        if self.misfire_policy not in MISFIRE_POLICIES:
+            raise ValueError(f"Unknown misfire policy: {self.misfire_policy}")
+        self.misfire_grace = misfire_grace if misfire_grace is not None else float(os.getenv('SCHEDULER_MISFIRE_GRACE', '60'))
+        self.max_catch_up = max_catch_up or int(os.getenv('SCHEDULER_MAX_CATCH_UP', '10'))
+        # Maximum schedules claimed per tick; None claims every due row
+        self.batch_size = batch_size or int(os.getenv('SCHEDULER_BATCH_SIZE', '0')) or None
+
+        # Identifies this instance's claims when several schedulers share task_schedules
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_ttl = float(os.getenv('SCHEDULER_LEASE_TTL', '30'))
+        # Seconds to wait before retrying a due schedule another instance had locked
+        self.claim_retry = float(os.getenv('SCHEDULER_CLAIM_RETRY', '1'))
         
     def start(self):
         """Start the scheduler in a background thread"""
         if not self.is_running:
+            # Runs a previous process queued but never finished would otherwise stay pending forever
+            self.executor.recover_orphans()
             self.is_running = True
             self.scheduler_thread = threading.Thread(target=self._run_scheduler)
             self.scheduler_thread.daemon = True
@@ -21,106 +104,336 @@ class TaskScheduler:
 
     def stop(self):
         """Stop the scheduler"""
-        self.is_running = False
+        with self._wakeup:
+            self.is_running = False
+            self._wakeup.notify_all()
         if self.scheduler_thread:
             self.scheduler_thread.join()
             logger.info("Task scheduler stopped")
 
+    def notify_change(self):
+        """Reload schedules from the database on the next wakeup"""
+        with self._wakeup:
+            self._needs_reload = True
+            self._wakeup.notify_all()
+
+    def _on_schedules_changed(self, scopes):
+        """Change feed callback: check the fingerprint now; it skips the reload for our own changes"""
+        with self._wakeup:
+            self._change_signalled = True
+            self._wakeup.notify_all()
+
     def _run_scheduler(self):
         """Main scheduler loop"""
         while self.is_running:
-            self._check_and_execute_tasks()
-            time.sleep(60)  # Check every minute
+            if self._needs_reload or self._change_check_due():
+                self._refresh_schedules()
 
-    def _check_and_execute_tasks(self):
-        """Check for due tasks and execute them"""
+            due_ids = self._pop_due_tasks()
+            if due_ids:
+                self._check_and_execute_tasks(due_ids)
+
+            with self._wakeup:
+                timeout = self._seconds_until_wakeup()
+                if self._needs_reload:
+                    # Pending or failed reload; retry shortly instead of spinning
+                    timeout = 1 if timeout is None else min(timeout, 1)
+                if self.is_running and (timeout is None or timeout > 0):
+                    self._wakeup.wait(timeout)
+
+    def _seconds_until_wakeup(self):
+        """Time to sleep until the earliest deadline or the next change check; None waits for a wakeup"""
+        if self._change_signalled:
+            return 0
+        timeout = None
+        if not self.change_feed:
+            timeout = self.reload_interval - (time.monotonic() - self._last_change_check)
+        if self._heap:
+            until_due = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+            timeout = until_due if timeout is None else min(timeout, until_due)
+        return None if timeout is None else max(timeout, 0)
+
+    def _change_check_due(self):
+        if self._change_signalled:
+            return True
+        if self.change_feed:
+            return False
+        return time.monotonic() - self._last_change_check >= self.reload_interval
+
+    def _schedule_fingerprint(self, session):
+        """Change-feed version of task_schedules; every writer bumps it in the same transaction as its change"""
+        return session.query(ChangeVersion.version).filter_by(scope='task_schedules').scalar() or 0
+
+    def _mark_loaded(self, version):
+        """Count this instance's own committed change, already applied to the heap, as loaded
+
+        version is read after bump_versions() in the committing transaction. Bumps
+        serialize on the change_versions row, so one past the loaded version means
+        nobody else changed schedules in between; otherwise the next check reloads.
+        """
+        with self._wakeup:
+            if self._fingerprint is not None and version == self._fingerprint + 1:
+                self._fingerprint = version
+
+    def _refresh_schedules(self):
+        """Rebuild the heap from task_schedules if they changed since the last load"""
+        with self._wakeup:
+            self._change_signalled = False
         try:
-            session = Session()
-            now = datetime.utcnow()
-            
-            # Get all active tasks that are due
-            due_tasks = session.query(TaskSchedule).filter(
-                TaskSchedule.is_active == True,
-                TaskSchedule.next_run <= now
-            ).all()
-
-            for task in due_tasks:
-                self._execute_task(task)
-                self._update_next_run(task)
-
-            session.commit()
-            session.close()
+            with session_scope() as session:
+                # Read before the rows, so a change landing in between triggers another reload
+                fingerprint = self._schedule_fingerprint(session)
+                if not self._needs_reload and fingerprint == self._fingerprint:
+                    return
+                rows = session.query(TaskSchedule.id, TaskSchedule.next_run).filter(
+                    TaskSchedule.is_active == True,
+                    TaskSchedule.next_run != None
+                ).all()
+
+            with self._wakeup:
+                self._next_runs = {task_id: next_run for task_id, next_run in rows}
+                self._heap = [(next_run, task_id) for task_id, next_run in rows]
+                heapq.heapify(self._heap)
+                self._needs_reload = False
+                self._fingerprint = fingerprint
+            logger.info(f"Loaded {len(rows)} active scheduled tasks")
         except Exception as e:
-            logger.error(f"Error in task scheduler: {e}")
+            logger.error(f"Error loading scheduled tasks: {e}")
+        finally:
+            self._last_change_check = time.monotonic()
+
+    def _push(self, task_id, next_run):
+        """Track a schedule's deadline, waking the loop if it is now the earliest"""
+        with self._wakeup:
+            self._next_runs[task_id] = next_run
+            heapq.heappush(self._heap, (next_run, task_id))
+            if self._heap[0] == (next_run, task_id):
+                self._wakeup.notify_all()
 
-    def _execute_task(self, task):
-        """Execute a scheduled task"""
+    def _pop_due_tasks(self):
+        """Pop every heap entry whose deadline has passed, returning their task ids"""
+        now = datetime.utcnow()
+        due = []
+        with self._wakeup:
+            while self._heap and self._heap[0][0] <= now:
+                next_run, task_id = heapq.heappop(self._heap)
+                if self._next_runs.get(task_id) == next_run:
+                    del self._next_runs[task_id]
+                    due.append(task_id)
+        return due
+
+    def _check_and_execute_tasks(self, expected_ids=()):
+        """Claim every due schedule, advance it and record its runs in one transaction"""
         try:
-            # Create agent task record
-            session = Session()
-            agent_task = AgentTask(
-                agent_name=task.agent_name,
-                task_type='scheduled',
-                task_status='running',
-                result=f"Executing scheduled task: {task.task_name}"
-            )
-            session.add(agent_task)
-            
-            # Update task's last run time
-            task.last_run = datetime.utcnow()
-            
-            session.commit()
-            session.close()
-            
-            logger.info(f"Executed scheduled task: {task.task_name} for agent: {task.agent_name}")
+            with session_scope() as session:
+                now = datetime.utcnow()
+                due_tasks = self._claim_due_tasks(session, now)
+                if not due_tasks:
+                    executed_ids, rescheduled, jobs = set(), [], []
+                else:
+                    executed_ids, rescheduled, jobs = self._advance_due_tasks(session, due_tasks, now)
+                    version = self._schedule_fingerprint(session)
+                missed_ids = set(expected_ids) - executed_ids
+                if missed_ids:
+                    batch_full = bool(self.batch_size) and len(due_tasks) >= self.batch_size
+                    rescheduled += self._recheck_missed(session, missed_ids, now, batch_full)
+                session.commit()
+
+            if executed_ids:
+                self._mark_loaded(version)
+                query_cache.invalidate_method('get_scheduled_tasks')
+                for agent_name in {job[1] for job in jobs}:
+                    invalidate_conversations(agent_name)
+
+            for task_id, next_run in rescheduled:
+                self._push(task_id, next_run)
+
+            # Run only after the records are committed, so workers can see them
+            for agent_task_id, agent_name, task_name, parameters in jobs:
+                self.executor.submit(agent_name, task_name, parameters, agent_task_id=agent_task_id)
+
+            if jobs:
+                logger.info(f"Queued {len(jobs)} scheduled task runs from {len(executed_ids)} schedules")
         except Exception as e:
-            logger.error(f"Error executing task {task.task_name}: {e}")
+            logger.error(f"Error in task scheduler: {e}")
+            # The heap no longer matches the table; rebuild it on the next pass
+            self._needs_reload = True
 
-    def _update_next_run(self, task):
-        """Calculate and update the next run time for a task"""
-        now = datetime.utcnow()
-        
-        if task.schedule_type == 'once':
-            task.is_active = False
-        elif task.schedule_type == 'daily':
-            task.next_run = now + timedelta(days=1)
-        elif task.schedule_type == 'weekly':
-            task.next_run = now + timedelta(weeks=1)
-        elif task.schedule_type == 'monthly':
-            # Add roughly a month (30 days)
-            task.next_run = now + timedelta(days=30)
+    def _recheck_missed(self, session, missed_ids, now, batch_full):
+        """Deadlines for popped schedules this tick did not claim, read from just their rows
+
+        Rows left out by the batch limit are retried on the next pass. Rows another
+        instance holds are retried when its lease expires, or after claim_retry when
+        they were skipped as locked. Rows changed elsewhere follow their new next_run;
+        deactivated or deleted ones are dropped.
+        """
+        retry_at = now if batch_full else now + timedelta(seconds=self.claim_retry)
+        rows = session.query(TaskSchedule.id, TaskSchedule.next_run, TaskSchedule.lease_expires_at).filter(
+            TaskSchedule.id.in_(missed_ids),
+            TaskSchedule.is_active == True,
+            TaskSchedule.next_run != None
+        ).all()
+        return [
+            (task_id, max(next_run, retry_at, lease_expires_at or retry_at))
+            for task_id, next_run, lease_expires_at in rows
+        ]
+
+    def _due_query(self, session, now, columns, *criteria):
+        """Active schedules whose deadline has passed, oldest first"""
+        query = session.query(*columns).filter(
+            TaskSchedule.is_active == True,
+            TaskSchedule.next_run <= now,
+            *criteria
+        ).order_by(TaskSchedule.next_run)
+        if self.batch_size:
+            query = query.limit(self.batch_size)
+        return query
+
+    def _claim_due_tasks(self, session, now):
+        """Claim due schedules so that no other scheduler instance runs them too
+
+        On Postgres the rows are locked with FOR UPDATE SKIP LOCKED for the rest of
+        the tick's transaction. Elsewhere (SQLite) a lease is written and committed
+        first; leases left behind by a crashed instance expire after lease_ttl.
+        The claimed rows are advanced and released right away in the same tick
+        (handlers run later on the executor), so leases need no renewal.
+        """
+        columns = (
+            TaskSchedule.id,
+            TaskSchedule.agent_name,
+            TaskSchedule.task_name,
+            TaskSchedule.schedule_type,
+            TaskSchedule.schedule_time,
+            TaskSchedule.next_run,
+            TaskSchedule.parameters
+        )
+        if session.get_bind().dialect.name == 'postgresql':
+            # Rows another instance is ticking are skipped instead of waited on
+            return self._due_query(session, now, columns).with_for_update(skip_locked=True, of=TaskSchedule).all()
+
+        claimable = self._due_query(session, now, (TaskSchedule.id,), or_(
+            TaskSchedule.lease_owner == None,
+            TaskSchedule.lease_expires_at < now
+        ))
+        claimed = session.query(TaskSchedule).filter(
+            TaskSchedule.id.in_(claimable.scalar_subquery())
+        ).update({
+            TaskSchedule.lease_owner: self.instance_id,
+            TaskSchedule.lease_expires_at: now + timedelta(seconds=self.lease_ttl)
+        }, synchronize_session=False)
+        session.commit()
+        if not claimed:
+            return []
+        return session.query(*columns).filter(
+            TaskSchedule.lease_owner == self.instance_id,
+            TaskSchedule.is_active == True,
+            TaskSchedule.next_run <= now
+        ).all()
+
+    def _advance_due_tasks(self, session, due_tasks, now):
+        """Reschedule claimed rows and insert their AgentTask records with set-based statements"""
+        schedule_updates = []
+        run_rows = []
+        run_jobs = []
+        for task in due_tasks:
+            next_run, runs = self._plan_runs(task, now)
+            schedule_updates.append({
+                'id': task.id,
+                'last_run': now,
+                'next_run': next_run or task.next_run,
+                'is_active': next_run is not None,
+                # Release the claim in the same statement
+                'lease_owner': None,
+                'lease_expires_at': None
+            })
+            for _ in range(runs):
+                run_rows.append({
+                    'agent_name': task.agent_name,
+                    'task_type': 'scheduled',
+                    'task_status': 'pending',
+                    'created_at': now,
+                    'result': f"Executing scheduled task: {task.task_name}",
+                    'executor_id': self.executor.instance_id
+                })
+                run_jobs.append((task.agent_name, task.task_name, task.parameters))
+
+        # One executemany UPDATE keyed on the primary key
+        session.execute(update(TaskSchedule), schedule_updates)
+
+        agent_task_ids = []
+        if run_rows:
+            agent_task_ids = session.execute(
+                insert(AgentTask).returning(AgentTask.id, sort_by_parameter_order=True),
+                run_rows
+            ).scalars().all()
+
+        bump_versions(session, 'task_schedules', *(f"agent_tasks:{row['agent_name']}" for row in run_rows))
+
+        executed_ids = {row['id'] for row in schedule_updates}
+        rescheduled = [(row['id'], row['next_run']) for row in schedule_updates if row['is_active']]
+        jobs = [(agent_task_id,) + job for agent_task_id, job in zip(agent_task_ids, run_jobs)]
+        return executed_ids, rescheduled, jobs
+
+    def _plan_runs(self, task, now):
+        """Return (next_run, number of runs to record now) for a due schedule
+
+        next_run is None when the schedule is finished. Recurring schedules stay on
+        the grid anchored at schedule_time, so late ticks never shift later runs.
+        """
+        late = (now - task.next_run).total_seconds() > self.misfire_grace
+        if self.misfire_policy == 'skip' and late:
+            runs = 0
+        else:
+            runs = 1
+
+        if task.schedule_type not in SCHEDULE_TYPES:
+            if task.schedule_type != 'once':
+                logger.warning(f"Unknown schedule type {task.schedule_type!r} for task {task.task_name}; deactivating")
+            return None, runs
+
+        anchor = task.schedule_time or task.next_run
+        next_index = occurrence_index_after(anchor, task.schedule_type, now)
+        if self.misfire_policy == 'catch_up':
+            # Every grid point between the missed deadline and now, capped
+            missed_from = occurrence_index_after(anchor, task.schedule_type, task.next_run - timedelta(microseconds=1))
+            runs = min(max(next_index - missed_from, 1), self.max_catch_up)
+        return occurrence(anchor, task.schedule_type, next_index), runs
 
     def add_task(self, agent_name, task_name, task_description, schedule_type, schedule_time, parameters=None):
         """Add a new scheduled task"""
         try:
-            session = Session()
-            task = TaskSchedule(
-                agent_name=agent_name,
-                task_name=task_name,
-                task_description=task_description,
-                schedule_type=schedule_type,
-                schedule_time=schedule_time,
-                parameters=parameters or {},
-                next_run=schedule_time
-            )
-            session.add(task)
-            session.commit()
-            session.close()
+            with session_scope() as session:
+                task = TaskSchedule(
+                    agent_name=agent_name,
+                    task_name=task_name,
+                    task_description=task_description,
+                    schedule_type=schedule_type,
+                    schedule_time=schedule_time,
+                    parameters=parameters or {},
+                    next_run=schedule_time
+                )
+                session.add(task)
+                bump_versions(session, 'task_schedules')
+                version = self._schedule_fingerprint(session)
+            query_cache.invalidate('get_scheduled_tasks', agent_name)
+            if task.next_run:
+                self._push(task.id, task.next_run)
+            self._mark_loaded(version)
             logger.info(f"Added new scheduled task: {task_name} for agent: {agent_name}")
             return True
         except Exception as e:
             logger.error(f"Error adding task: {e}")
             return False
 
+    @cached_query
     def get_scheduled_tasks(self, agent_name=None):
         """Get all scheduled tasks, optionally filtered by agent"""
         try:
-            session = Session()
-            query = session.query(TaskSchedule)
-            if agent_name:
-                query = query.filter_by(agent_name=agent_name)
-            tasks = query.order_by(TaskSchedule.next_run).all()
-            session.close()
+            with session_scope() as session:
+                query = session.query(TaskSchedule)
+                if agent_name:
+                    query = query.filter_by(agent_name=agent_name)
+                tasks = query.order_by(TaskSchedule.next_run).all()
             return tasks
         except Exception as e:
             logger.error(f"Error getting scheduled tasks: {e}")
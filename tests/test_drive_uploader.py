@@ -0,0 +1,241 @@
+import json
+import os
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+import drive_uploader
+from drive_uploader import DriveUploader, UploadError, FOLDER_MIME_TYPE
+
+CHUNK = 256 * 1024
+
+class Interrupted(Exception):
+    """Raised from a progress callback to stop an upload midway, like a crash would"""
+
+class DriveStub:
+    """Just enough of the Drive resumable upload and folder APIs, with injectable failures"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.files = {}
+        self.folders = {}
+        self.puts = []
+        # Fail the next N chunk PUTs with 503, keeping this many bytes of each
+        self.fail_puts = 0
+        self.keep_on_failure = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def _reply(self, status, headers=None, payload=None):
+                body = json.dumps(payload).encode() if payload is not None else b''
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                # Folder lookup: files?q=name = '...' and '<parent>' in parents ...
+                query = requests.utils.unquote(self.path.split('q=', 1)[1].split('&', 1)[0].replace('+', ' '))
+                name, parent = re.match(r"name = '(.*)' and '(.*)' in parents", query).groups()
+                folder_id = stub.folders.get((parent, name))
+                self._reply(200, payload={'files': [{'id': folder_id}] if folder_id else []})
+
+            def do_POST(self):
+                metadata = json.loads(self._body())
+                parent = (metadata.get('parents') or ['root'])[0]
+                if self.path.startswith('/files'):
+                    assert metadata['mimeType'] == FOLDER_MIME_TYPE
+                    folder_id = f"folder-{len(stub.folders)}"
+                    stub.folders[(parent, metadata['name'])] = folder_id
+                    return self._reply(200, payload={'id': folder_id})
+                session_id = uuid.uuid4().hex
+                with stub.lock:
+                    stub.sessions[session_id] = {
+                        'name': metadata['name'],
+                        'parent': parent,
+                        'size': int(self.headers['X-Upload-Content-Length']),
+                        'data': bytearray()
+                    }
+                self._reply(200, {'Location': f"{stub.url}/session/{session_id}"})
+
+            def do_PUT(self):
+                body = self._body()
+                session = stub.sessions.get(self.path.rsplit('/', 1)[1])
+                if session is None:
+                    return self._reply(404)
+                match = re.match(r'bytes (\d+)-(\d+)/(\d+)', self.headers['Content-Range'])
+                if match:
+                    stub.puts.append(int(match.group(1)))
+                    if int(match.group(1)) != len(session['data']):
+                        return self._reply(400)
+                    with stub.lock:
+                        failing = stub.fail_puts > 0
+                        stub.fail_puts -= failing
+                    if failing:
+                        session['data'] += body[:stub.keep_on_failure]
+                        return self._reply(503)
+                    session['data'] += body
+                if len(session['data']) == session['size']:
+                    file_id = f"file-{len(stub.files)}"
+                    stub.files[file_id] = (session['parent'], session['name'], bytes(session['data']))
+                    return self._reply(200, payload={'id': file_id})
+                headers = {'Range': f"bytes=0-{len(session['data']) - 1}"} if session['data'] else {}
+                self._reply(308, headers)
+
+        return Handler
+
+@pytest.fixture
+def stub():
+    server = DriveStub()
+    yield server
+    server.close()
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(drive_uploader.time, 'sleep', lambda seconds: None)
+
+@pytest.fixture
+def make_uploader(stub, tmp_path):
+    def make(**kwargs):
+        return DriveUploader(
+            requests.Session,
+            upload_url=f"{stub.url}/upload",
+            files_url=f"{stub.url}/files",
+            chunk_size=CHUNK,
+            state_dir=str(tmp_path / 'state'),
+            **kwargs
+        )
+    return make
+
+def write_file(path, size):
+    data = os.urandom(size)
+    path.write_bytes(data)
+    return str(path), data
+
+def test_uploads_in_chunks(stub, make_uploader, tmp_path):
+    file_path, data = write_file(tmp_path / 'data.bin', 3 * CHUNK + 100)
+    file_id = make_uploader().upload(file_path)
+
+    assert stub.files[file_id] == ('root', 'data.bin', data)
+    assert stub.puts == [0, CHUNK, 2 * CHUNK, 3 * CHUNK]
+    assert not os.listdir(tmp_path / 'state')
+
+def test_resumes_from_the_range_the_server_reports(stub, make_uploader, tmp_path):
+    file_path, data = write_file(tmp_path / 'data.bin', 4 * CHUNK)
+
+    def interrupt(path, done, total):
+        if done >= 2 * CHUNK:
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        make_uploader().upload(file_path, progress=interrupt)
+    assert len(os.listdir(tmp_path / 'state')) == 1
+
+    # A fresh uploader (e.g. after a restart) asks the saved session for its offset
+    progress = []
+    file_id = make_uploader().upload(file_path, progress=lambda path, done, total: progress.append(done))
+    assert stub.files[file_id][2] == data
+    assert progress[0] == 3 * CHUNK
+    assert stub.puts == [0, CHUNK, 2 * CHUNK, 3 * CHUNK]
+
+def test_retries_503_and_continues_from_what_landed(stub, make_uploader, tmp_path):
+    file_path, data = write_file(tmp_path / 'data.bin', 2 * CHUNK + 10)
+    stub.fail_puts = 2
+    stub.keep_on_failure = 1000
+
+    file_id = make_uploader().upload(file_path)
+    assert stub.files[file_id][2] == data
+    # The failed chunk partly landed; the retry starts from the reported offset, not the chunk start
+    assert stub.puts[:3] == [0, 1000, 2000]
+
+def test_gives_up_after_max_retries(stub, make_uploader, tmp_path):
+    file_path, _ = write_file(tmp_path / 'data.bin', 100)
+    stub.fail_puts = 100
+
+    with pytest.raises(UploadError):
+        make_uploader(max_retries=2).upload(file_path)
+    assert stub.files == {}
+
+def test_restarts_when_the_saved_session_expired(stub, make_uploader, tmp_path):
+    file_path, data = write_file(tmp_path / 'data.bin', 3 * CHUNK)
+
+    def interrupt(path, done, total):
+        raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        make_uploader().upload(file_path, progress=interrupt)
+    stub.sessions.clear()
+
+    file_id = make_uploader().upload(file_path)
+    assert stub.files[file_id][2] == data
+    assert not os.listdir(tmp_path / 'state')
+
+def test_uploads_an_empty_file(stub, make_uploader, tmp_path):
+    file_path, _ = write_file(tmp_path / 'empty.txt', 0)
+    file_id = make_uploader().upload(file_path)
+    assert stub.files[file_id] == ('root', 'empty.txt', b'')
+
+def test_upload_many_reports_overall_progress(stub, make_uploader, tmp_path):
+    files = [write_file(tmp_path / f"f{i}.bin", i * CHUNK + 1) for i in range(4)]
+    progress = []
+    results = make_uploader().upload_many(
+        [(file_path, os.path.basename(file_path)) for file_path, _ in files],
+        progress=lambda *args: progress.append(args)
+    )
+
+    for file_path, data in files:
+        assert stub.files[results[file_path]][2] == data
+    total = sum(len(data) for _, data in files)
+    assert max(overall for _, _, _, overall, _ in progress) == total
+
+def test_folders_are_found_or_created_once(stub, make_uploader):
+    uploader = make_uploader()
+    nested = uploader.ensure_folder_path(['agent', 'logs'])
+    assert uploader.ensure_folder_path(['agent', 'logs']) == nested
+    assert len(stub.folders) == 2
+
+    # A new uploader finds the existing folders instead of creating duplicates
+    assert make_uploader().ensure_folder_path(['agent', 'logs']) == nested
+    assert len(stub.folders) == 2
+
+def test_agent_backups_mirror_directories_into_the_agent_folder(stub, make_uploader, tmp_path):
+    from storage_handlers import StorageManager
+
+    for agent in ('Scout', 'Editor'):
+        (tmp_path / agent / 'logs').mkdir(parents=True)
+        (tmp_path / agent / 'logs' / 'output.log').write_text(f"{agent} log")
+        (tmp_path / agent / 'notes.txt').write_text(agent)
+
+    manager = StorageManager()
+    manager.drive_uploader = make_uploader()
+    for agent in ('Scout', 'Editor'):
+        assert manager.backup_agent_data(agent, str(tmp_path / agent))
+
+    agent_folder = stub.folders[('root', 'agent-Scout-backup')]
+    logs_folder = stub.folders[(agent_folder, 'logs')]
+    uploaded = {(parent, name): data for parent, name, data in stub.files.values()}
+    assert uploaded[(logs_folder, 'output.log')] == b"Scout log"
+    assert uploaded[(agent_folder, 'notes.txt')] == b"Scout"
+    assert len(uploaded) == 4
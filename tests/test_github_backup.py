@@ -0,0 +1,185 @@
+import base64
+import hashlib
+import json
+import os
+import subprocess
+import types
+import pytest
+from github import GithubException
+import github_backup
+from github_backup import GitHubBackup, git_blob_sha
+
+class FakeRepo:
+    """In-memory stand-in for the Git Data API calls GitHubBackup makes"""
+
+    url = 'https://api.github.test/repos/me/backup'
+
+    def __init__(self, files=None):
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.refs = {}
+        self.calls = []
+        if files:
+            # An initial commit, like a repository created with auto_init
+            elements = []
+            for path, data in files.items():
+                sha = self._store_blob(data)
+                elements.append(types.SimpleNamespace(_identity={'path': path, 'mode': '100644', 'sha': sha}))
+            tree = self._build_tree({}, elements)
+            self.refs['heads/main'] = self._store_commit(tree)
+        self.calls.clear()
+
+    def _store_blob(self, data):
+        sha = hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+        self.blobs[sha] = data
+        return sha
+
+    def _build_tree(self, entries, elements):
+        entries = dict(entries)
+        for element in elements:
+            raw = element._identity
+            if raw['sha'] is None:
+                del entries[raw['path']]
+            else:
+                assert raw['sha'] in self.blobs, f"tree references missing blob {raw['sha']}"
+                entries[raw['path']] = (raw['sha'], raw['mode'])
+        sha = hashlib.sha1(json.dumps(sorted(entries.items())).encode()).hexdigest()
+        self.trees[sha] = entries
+        return types.SimpleNamespace(sha=sha)
+
+    def _store_commit(self, tree):
+        sha = hashlib.sha1(os.urandom(16)).hexdigest()
+        self.commits[sha] = types.SimpleNamespace(sha=sha, tree=tree)
+        return sha
+
+    def files(self):
+        """{path: bytes} at the branch head"""
+        tree = self.commits[self.refs['heads/main']].tree
+        return {path: self.blobs[sha] for path, (sha, _) in self.trees[tree.sha].items()}
+
+    def get_git_ref(self, name):
+        self.calls.append('get_git_ref')
+        if name not in self.refs:
+            raise GithubException(404, {}, {})
+        repo = self
+
+        class Ref:
+            object = types.SimpleNamespace(sha=self.refs[name])
+
+            def edit(self, sha):
+                repo.calls.append('edit')
+                repo.refs[name] = sha
+
+        return Ref()
+
+    def get_git_commit(self, sha):
+        self.calls.append('get_git_commit')
+        return self.commits[sha]
+
+    def get_git_tree(self, sha, recursive=False):
+        self.calls.append('get_git_tree')
+        return types.SimpleNamespace(sha=sha, tree=[
+            types.SimpleNamespace(path=path, sha=blob_sha, mode=mode, type='blob')
+            for path, (blob_sha, mode) in self.trees[sha].items()
+        ])
+
+    def create_git_blob(self, content, encoding):
+        self.calls.append('create_git_blob')
+        return types.SimpleNamespace(sha=self._store_blob(base64.b64decode(content)))
+
+    def create_git_tree(self, elements, base_tree=None):
+        self.calls.append('create_git_tree')
+        return self._build_tree(self.trees[base_tree.sha] if base_tree else {}, elements)
+
+    def create_git_commit(self, message, tree, parents):
+        self.calls.append('create_git_commit')
+        return types.SimpleNamespace(sha=self._store_commit(tree))
+
+    def create_git_ref(self, name, sha):
+        self.calls.append('create_git_ref')
+        self.refs[name[len('refs/'):]] = sha
+
+@pytest.fixture
+def repo():
+    return FakeRepo({'README.md': b"# backup\n"})
+
+def test_single_files_accumulate_and_leave_other_paths_alone(repo, tmp_path):
+    backup = GitHubBackup('token')
+    (tmp_path / 'a.txt').write_text('a')
+    (tmp_path / 'b.txt').write_text('b')
+
+    backup.backup(repo, str(tmp_path / 'a.txt'))
+    backup.backup(repo, str(tmp_path / 'b.txt'))
+    assert repo.files() == {'README.md': b"# backup\n", 'a.txt': b'a', 'b.txt': b'b'}
+
+def test_unchanged_run_writes_nothing(repo, tmp_path):
+    backup = GitHubBackup('token')
+    (tmp_path / 'a.txt').write_text('a')
+    backup.backup(repo, str(tmp_path / 'a.txt'))
+    repo.calls.clear()
+
+    assert backup.backup(repo, str(tmp_path / 'a.txt')) is None
+    assert repo.calls == ['get_git_ref', 'get_git_commit', 'get_git_tree']
+
+def test_directory_mirror_deletes_only_under_its_prefix(repo, tmp_path):
+    backup = GitHubBackup('token')
+    data = tmp_path / 'data'
+    (data / 'sub').mkdir(parents=True)
+    for i in range(3):
+        (data / 'sub' / f"f{i}.txt").write_text(str(i))
+    (tmp_path / 'other.txt').write_text('other')
+    backup.backup(repo, str(tmp_path / 'other.txt'))
+    backup.backup(repo, str(data), prefix='data', delete_missing=True)
+
+    (data / 'sub' / 'f0.txt').write_text('changed')
+    (data / 'sub' / 'f1.txt').unlink()
+    repo.calls.clear()
+    backup.backup(repo, str(data), prefix='data', delete_missing=True)
+
+    assert repo.files() == {
+        'README.md': b"# backup\n",
+        'other.txt': b'other',
+        'data/sub/f0.txt': b'changed',
+        'data/sub/f2.txt': b'2'
+    }
+    assert repo.calls.count('create_git_blob') == 1
+    assert repo.calls.count('create_git_commit') == 1
+
+def test_content_already_in_the_repo_is_not_uploaded_again(repo, tmp_path):
+    backup = GitHubBackup('token')
+    (tmp_path / 'copy.md').write_text("# backup\n")
+
+    backup.backup(repo, str(tmp_path / 'copy.md'))
+    assert 'create_git_blob' not in repo.calls
+    assert repo.files()['copy.md'] == b"# backup\n"
+
+def test_delete_missing_needs_a_prefix(repo, tmp_path):
+    with pytest.raises(ValueError):
+        GitHubBackup('token').backup(repo, str(tmp_path), delete_missing=True)
+    assert repo.files() == {'README.md': b"# backup\n"}
+
+def test_large_files_are_streamed(repo, tmp_path, monkeypatch):
+    path = tmp_path / 'big.bin'
+    data = os.urandom(github_backup.READ_SIZE * 2 + 5)
+    path.write_bytes(data)
+    monkeypatch.setattr(github_backup, 'GITHUB_STREAM_THRESHOLD', 1024)
+
+    def post(url, data, headers, timeout):
+        assert url == f"{repo.url}/git/blobs"
+        sent = b''
+        while chunk := data.read(8192):
+            sent += chunk
+        assert len(sent) == len(data)
+        sha = repo._store_blob(base64.b64decode(json.loads(sent)['content']))
+        return types.SimpleNamespace(raise_for_status=lambda: None, json=lambda: {'sha': sha})
+
+    monkeypatch.setattr(github_backup.requests, 'post', post)
+    GitHubBackup('token').backup(repo, str(path))
+    assert repo.files()['big.bin'] == data
+
+def test_git_blob_sha_matches_git(tmp_path):
+    path = tmp_path / 'file.bin'
+    path.write_bytes(os.urandom(github_backup.READ_SIZE + 3))
+    expected = subprocess.check_output(['git', 'hash-object', str(path)], text=True).strip()
+    assert git_blob_sha(str(path)) == expected
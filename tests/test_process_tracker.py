@@ -0,0 +1,113 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import psutil
+import pytest
+import process_tracker
+from process_tracker import ProcessTracker, probe_http
+
+class FakeProcess:
+    def __init__(self, pid, name):
+        self.pid = pid
+        self.info = {'name': name}
+        self.alive = True
+
+    def is_running(self):
+        return self.alive
+
+    def status(self):
+        return psutil.STATUS_RUNNING
+
+@pytest.fixture
+def process_table(monkeypatch):
+    """Replace the process table with a list the test controls, counting scans"""
+    table = []
+    scans = []
+
+    def process_iter(attrs=None):
+        scans.append(time.monotonic())
+        return list(table)
+
+    monkeypatch.setattr(process_tracker.psutil, 'process_iter', process_iter)
+    return table, scans
+
+def test_pids_are_cached_between_checks(process_table):
+    table, scans = process_table
+    table.extend([FakeProcess(10, 'ollama'), FakeProcess(11, 'bash')])
+    tracker = ProcessTracker('Ollama')
+
+    assert tracker.pids() == [10]
+    assert tracker.pids() == [10]
+    assert tracker.is_running()
+    assert len(scans) == 1
+
+def test_rescans_when_cached_processes_exit(process_table):
+    table, scans = process_table
+    first = FakeProcess(10, 'ollama')
+    table.append(first)
+    tracker = ProcessTracker('ollama', rescan_interval=0)
+    assert tracker.pids() == [10]
+
+    # The server restarted under a new PID
+    first.alive = False
+    table[:] = [FakeProcess(20, 'ollama')]
+    assert tracker.pids() == [20]
+    assert len(scans) == 2
+
+def test_misses_rescan_at_most_once_per_interval(process_table):
+    table, scans = process_table
+    tracker = ProcessTracker('ollama', rescan_interval=60)
+
+    assert tracker.pids() == []
+    table.append(FakeProcess(10, 'ollama'))
+    assert tracker.pids() == []
+    assert len(scans) == 1
+
+def test_invalidate_forces_a_rescan(process_table):
+    table, scans = process_table
+    tracker = ProcessTracker('ollama', rescan_interval=60)
+    assert not tracker.is_running()
+
+    table.append(FakeProcess(10, 'ollama'))
+    tracker.invalidate()
+    assert tracker.pids() == [10]
+    assert len(scans) == 2
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/slow':
+            time.sleep(1)
+        status = 500 if self.path == '/error' else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_probe_http_accepts_2xx(stub_server):
+    assert probe_http(f"{stub_server}/api/tags")
+
+def test_probe_http_rejects_errors(stub_server):
+    assert not probe_http(f"{stub_server}/error")
+
+def test_probe_http_times_out(stub_server):
+    started = time.monotonic()
+    assert not probe_http(f"{stub_server}/slow", timeout=0.2)
+    assert time.monotonic() - started < 1
+
+def test_probe_http_connection_refused():
+    # Nothing listens on a port once its server has closed
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    port = server.server_address[1]
+    server.server_close()
+    assert not probe_http(f"http://127.0.0.1:{port}/api/tags", timeout=0.5)